@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+"""Offline benchmark of the stats pipeline on synthetic games
+
+    python -m bench --months 3 --games 2000
+
+generates the game files (bench.generate), times every stage of stats.py
+on them and compares timings and results with bench/baseline.json.
+Timings are machine-specific: they are only flagged against a baseline
+saved on the same machine, the results are compared anywhere.
+"""
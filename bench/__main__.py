@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from pathlib import Path
+
+from bench import __doc__
+from bench.generate import OPTION_SETS, GameGenerator
+from bench.run import compare, run
+from stats import FDICT
+
+BASELINE = Path(__file__).parent / 'baseline.json'
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--months', type=int, default=2, help="game files to generate")
+parser.add_argument('--games', type=int, default=2000, help="games per file")
+parser.add_argument('--players', type=int, default=2000, help="distinct players")
+parser.add_argument('--factions', type=int, default=len(FDICT), help="distinct factions")
+parser.add_argument('--maps', type=int, default=3, help="distinct maps")
+parser.add_argument('--option-sets', type=int, default=len(OPTION_SETS), help="distinct option sets")
+parser.add_argument('--setups', type=int, default=100,
+                    help="distinct game setups replayed, caps the key cardinality so keys group several "
+                         "records (0: every game differs)")
+parser.add_argument('--irregular', type=float, default=0.01, help="share of games hitting each skip path")
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--repeat', type=int, default=3, help="runs per stage, the best is kept")
+parser.add_argument('--games-dir', type=Path, help="keep the generated game files in this directory")
+parser.add_argument('--baseline', type=Path, default=BASELINE)
+parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+parser.add_argument('--tolerance', type=float, default=0.2, help="timing change flagged as slower or faster")
+args = parser.parse_args()
+
+config = {name: getattr(args, name)
+          for name in ('months', 'games', 'players', 'factions', 'maps', 'option_sets', 'setups', 'irregular', 'seed')}
+
+with tempfile.TemporaryDirectory() as tmp:
+    generator = GameGenerator(args.players, args.factions, args.maps, args.option_sets, args.setups,
+                              args.irregular, args.seed)
+    ratings = generator.ratings()
+    print("generating", args.months, "x", args.games, "games ...")
+    game_fns = generator.write(args.games_dir or Path(tmp), args.months, args.games)
+    print("running", args.repeat, "times ...")
+    timings, results = run(game_fns, ratings, args.repeat)
+
+report = {
+    'config': config,
+    'python': platform.python_version(),
+    'machine': {'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+                'cpus': os.cpu_count()},
+    'timings': timings,
+    'results': results,
+}
+
+same = True
+if args.baseline.is_file() and not args.save_baseline:
+    with open(args.baseline) as f:
+        lines, same = compare(report, json.load(f), args.tolerance)
+    print('\n'.join(lines))
+else:
+    for stage, t in timings.items():
+        print(f"  {stage:10} {t:8.3f}s")
+    if args.save_baseline:
+        with open(args.baseline, 'w+') as f:
+            json.dump(report, f, indent=2)
+        print("saved", args.baseline)
+    else:
+        print("no baseline at", args.baseline)
+print(f"{results['games']} games, {results['records']} records, "
+      f"{results['stats']['keys']} stats keys, {results['chooser']['keys']} chooser keys")
+sys.exit(0 if same else 1)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""Synthetic monthly game files, shaped like terra.snellman.net event dumps
+
+Only the parts stats.py reads are generated: factions, base_map,
+last_update, player_count and the 'faction' and 'global' event rounds.
+A small share of the games hit each of the skip paths of parse_game.
+"""
+
+import json
+import random
+
+from stats import FDICT, MAPDICT
+
+SCORE_TILES = range(1, 10)
+
+OPTION_SETS = [
+    ['option-errata-cultist-power', 'option-mini-expansion-1', 'option-shipping-bonus'],
+    ['option-errata-cultist-power', 'option-shipping-bonus', 'option-fire-and-ice-factions/variable_v3',
+     'option-strict-leech', 'option-variable-turn-order'],
+    ['option-errata-cultist-power', 'option-mini-expansion-1', 'option-temple-scoring-tile',
+     'option-fire-and-ice-factions/variable_v5'],
+    ['option-email-notify', 'option-strict-darkling-sh'],
+]
+
+FINAL_SCORINGS = [
+    None,
+    'scoring-connected-distance',
+    'scoring-connected-sa-sh-distance',
+    'scoring-building-on-edge',
+    'scoring-connected-clusters',
+]
+
+
+def rounds(counts):
+    """Event rounds as in the dumps: 'all' plus every non zero round."""
+    event = {'all': sum(counts.values())}
+    event.update((str(r), count) for r, count in counts.items() if count)
+    return {'round': event}
+
+
+class GameGenerator(object):
+    """Random games over a fixed number of players, factions and maps
+
+    The number of distinct stats keys grows with factions, maps and
+    option_sets. With setups, games only replay that many distinct setups
+    and faction histories (only the players differ), which caps the key
+    cardinality. irregular is the share of games hitting each skip path.
+    """
+
+    def __init__(self, players=2000, factions=len(FDICT), maps=3, option_sets=len(OPTION_SETS),
+                 setups=0, irregular=0.01, seed=0):
+        self.rng = random.Random(seed)
+        self.setups = setups
+        self.players = [f'player_{i}' for i in range(players)]
+        self.factions = list(FDICT)[:factions]
+        self.maps = list(MAPDICT)[:maps]
+        self.option_sets = OPTION_SETS[:option_sets]
+        self.irregular = irregular
+
+    def ratings(self, rated=0.8):
+        """ratings.json 'players' of a share of the players."""
+        return {player: {'score': self.rng.gauss(1100, 150)}
+                for player in self.players if self.rng.random() < rated}
+
+    def faction_events(self, rng, numplayers, seat):
+        vp = {r: rng.randint(3, 30) for r in range(1, 7)}
+        events = {
+            'vp': rounds(vp),
+            'build:D': rounds({0: 2, 1: rng.randint(0, 2), 2: rng.randint(0, 2), 3: rng.randint(0, 1)}),
+            'upgrade:TP': rounds({1: int(rng.random() < .3), 2: rng.randint(0, 2)}),
+            'upgrade:TE': rounds({2: int(rng.random() < .5), 3: 1}),
+            'upgrade:SA': rounds({4: int(rng.random() < .5)}),
+            'leech:pw': rounds({r: rng.randint(0, 12) for r in range(1, 7)}),
+        }
+        if rng.random() < .6:
+            events['upgrade:SH'] = rounds({rng.randint(1, 4): 1})
+        for fav in rng.sample(range(1, 13), rng.randint(2, 5)):
+            events[f'favor:FAV{fav}'] = rounds({rng.randint(1, 6): 1})
+        for r in range(1, 7):
+            order = events.setdefault(f'order:{(seat + r) % numplayers + 1}', rounds({}))
+            order['round'][str(r)] = 1
+            order['round']['all'] += 1
+        return events
+
+    def game(self, name, month):
+        rng = self.rng
+        if self.setups:
+            rng = random.Random(rng.randrange(self.setups))
+        numplayers = rng.randint(2, min(5, len(self.factions)))
+        factions = rng.sample(self.factions, numplayers)
+        players = self.rng.sample(self.players, numplayers)
+        events = {faction: self.faction_events(rng, numplayers, seat) for seat, faction in enumerate(factions)}
+
+        all_events = {'vp': rounds({})}
+        all_events['vp']['round']['all'] = sum(e['vp']['round']['all'] for e in events.values())
+        for r in range(7):
+            # round 0 only offers the first bonus tiles
+            for faction, bon in zip(factions, rng.sample(range(1, 7 if r == 0 else 11), numplayers)):
+                for e in (events[faction], all_events):
+                    event = e.setdefault(f'pass:BON{bon}', rounds({}))
+                    event['round'][str(r)] = event['round'].get(str(r), 0) + 1
+                    event['round']['all'] += 1
+        events['all'] = all_events
+
+        global_ = {'faction-count': rounds({0: numplayers})}
+        tiles = rng.sample(SCORE_TILES, 6)
+        for r, tile in enumerate(tiles, 1):
+            global_[f'SCORE{tile}'] = rounds({r: 1})
+        for option in rng.choice(self.option_sets):
+            global_[option] = rounds({0: 1})
+        final_scoring = rng.choice(FINAL_SCORINGS)
+        if final_scoring:
+            global_[final_scoring] = rounds({6: 1})
+
+        game = {
+            'game': name,
+            'base_map': rng.choice(self.maps),
+            'factions': [{'faction': f, 'player': p} for f, p in zip(factions, players)],
+            'events': {'faction': events, 'global': global_},
+            'player_count': numplayers,
+            'last_update': f'{month}-{self.rng.randint(1, 28):02d} 12:00:00',
+        }
+        self.irregularize(game)
+        return game
+
+    def irregularize(self, game):
+        """Break the game in one of the ways parse_game skips, now and then."""
+        rng = self.rng
+        if rng.random() >= self.irregular * 6:
+            return
+        kind = rng.randrange(6)
+        factions = game['factions']
+        events = game['events']
+        if kind == 0:
+            factions[0]['player'] = 'player1'
+        elif kind == 1:
+            events['global']['drop-faction'] = rounds({3: 1})
+        elif kind == 2 and len(factions) > 1:
+            factions[1]['player'] = factions[0]['player']
+        elif kind == 3:
+            events['global']['faction-count']['round']['all'] -= 1
+        elif kind == 4:
+            del events['faction'][factions[0]['faction']]['vp']
+        else:
+            faction = events['faction'][factions[-1]['faction']]
+            for event in [event for event in faction if event.startswith('pass:')]:
+                del faction[event]
+
+    def month(self, month, games):
+        return [self.game(f'bench{month.replace("-", "")}_{i}', month) for i in range(games)]
+
+    def write(self, path, months=3, games=1000, start=(2017, 1)):
+        """Write months game files of games games into path, return their paths."""
+        path.mkdir(parents=True, exist_ok=True)
+        game_fns = []
+        year, month = start
+        for m in range(months):
+            name = f'{year + (month - 1 + m) // 12}-{(month - 1 + m) % 12 + 1:02d}'
+            game_fn = path / (name + '.json')
+            with open(game_fn, 'w') as f:
+                json.dump(self.month(name, games), f)
+            game_fns.append(game_fn)
+        return game_fns
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""Stage timings and result digests of the stats pipeline"""
+
+import hashlib
+import io
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import stats
+from gameio import read_games
+from records import RecordBuffer
+
+STAGES = ('decode', 'records', 'keys', 'statpool', 'save')
+KEY_FUNCS = {'stats': stats.get_key, 'chooser': stats.get_key2}
+
+
+def digest(statpool):
+    """Fingerprint of a statpool, insensitive to key order and float noise."""
+    h = hashlib.sha1()
+    for key in sorted(statpool):
+        h.update(key.encode())
+        for s in statpool[key][:2]:
+            h.update(f' {s.n} {s.mean:.9g} {s.M2:.9g}'.encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def run_once(game_fns, ratings):
+    """Time every stage once; returns (timings, results)."""
+    stats.debug = False
+    stats.ratings = ratings
+    timings = {}
+
+    def timed(stage, func):
+        start = time.perf_counter()
+        result = func()
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    def decode():
+        months = []
+        for game_fn in game_fns:
+            months.append(list(read_games(game_fn)))
+        return months
+
+    def build(months):
+        records = RecordBuffer()
+        for game_fn, games in zip(game_fns, months):
+            for game in games:
+                stats.parse_game(game, game_fn, records)
+        records = records.records()
+        records.ratings = stats.get_ratings(records.users)
+        return records
+
+    def keys(records):
+        for key_func in KEY_FUNCS.values():
+            key_func.encode(records)
+
+    with redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as tmp:
+        months = timed('decode', decode)
+        records = timed('records', lambda: build(months))
+        timed('keys', lambda: keys(records))
+        statpools = timed('statpool', lambda: stats.compute_all_stats(records, list(KEY_FUNCS.values())))
+        timed('save', lambda: [stats.save_stats(statpool, Path(tmp) / (name + '.json'))
+                               for name, statpool in zip(KEY_FUNCS, statpools)])
+
+    results = {
+        'games': sum(map(len, months)),
+        'records': len(records),
+    }
+    for name, statpool in zip(KEY_FUNCS, statpools):
+        results[name] = {'keys': len(statpool), 'digest': digest(statpool)}
+    return timings, results
+
+
+def run(game_fns, ratings, repeat=3):
+    """Best time of every stage over repeat runs, and the results."""
+    best = {}
+    for _ in range(repeat):
+        timings, results = run_once(game_fns, ratings)
+        for stage, t in timings.items():
+            best[stage] = min(t, best.get(stage, t))
+    return best, results
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Lines comparing report with baseline, and whether the results still match.
+
+    Timings are only flagged slower or faster against a baseline recorded
+    on the same machine, they mean nothing across machines.
+    """
+    lines = []
+    if baseline['config'] != report['config']:
+        lines.append("baseline was run with another config, only timings are shown:")
+        for stage in STAGES:
+            lines.append(f"  {stage:10} {report['timings'][stage]:8.3f}s")
+        return lines, True
+
+    same_machine = baseline.get('machine') == report['machine']
+    if not same_machine:
+        lines.append("baseline timings were recorded on another machine, not compared"
+                     " (python -m bench --save-baseline records this one's):")
+    for stage in STAGES:
+        t, base = report['timings'][stage], baseline['timings'][stage]
+        ratio = t / base if base else float('inf')
+        flag = ""
+        if same_machine:
+            flag = "  SLOWER" if ratio > 1 + tolerance else "  faster" if ratio < 1 - tolerance else ""
+        lines.append(f"  {stage:10} {t:8.3f}s  baseline {base:8.3f}s  x{ratio:.2f}{flag}")
+
+    same = report['results'] == baseline['results']
+    if same:
+        lines.append("results match the baseline")
+    else:
+        for name, value in report['results'].items():
+            if value != baseline['results'].get(name):
+                lines.append(f"RESULT MISMATCH {name}: {value} != {baseline['results'].get(name)}")
+    return lines, same
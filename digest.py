@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""Mergeable quantile sketch
+
+A Digest keeps a sample as at most size centroids (mean, weight), a
+merging t-digest: values are exact until there are more distinct ones
+than size, then neighbouring centroids are merged, keeping them small
+near the tails (k1 scale function) where percentiles need resolution.
+Like Welford it takes single values or iterables and merges with +, so
+statpools of digests merge key by key the same way.
+
+Digests of a statpool are stored after the moments of a stats shard as
+
+    magic   b'TMD1'
+    uint32  number of digests per key
+    uint32  centroid count of every digest, key by key
+    float64 means of every centroid, digest by digest
+    uint32  weights of every centroid, in the same order
+
+all little-endian.
+"""
+
+import math
+import struct
+
+import numpy as np
+
+MAGIC = b'TMD1'
+HEADER = struct.Struct('<4sI')
+
+# centroids kept per digest
+DIGEST_SIZE = 64
+
+
+def compress(means, weights, size=DIGEST_SIZE):
+    """Merge sorted centroids down to at most size of them."""
+    if len(means) <= size:
+        return means, weights
+    total = sum(weights)
+    # k1 scale: a centroid spans at most one unit of size / (2 pi) * asin(2q - 1)
+    scale = size / (2 * math.pi)
+
+    def limit(q):
+        k = min(scale * math.asin(2 * q - 1) + 1, size / 4)
+        return (math.sin(k / scale) + 1) / 2 * total
+
+    new_means, new_weights = [means[0]], [weights[0]]
+    done = 0
+    bound = limit(0)
+    for mean, weight in zip(means[1:], weights[1:]):
+        if done + new_weights[-1] + weight <= bound:
+            w = new_weights[-1] + weight
+            new_means[-1] += (mean - new_means[-1]) * weight / w
+            new_weights[-1] = w
+        else:
+            done += new_weights[-1]
+            bound = limit(done / total)
+            new_means.append(mean)
+            new_weights.append(weight)
+    return new_means, new_weights
+
+
+class Digest(object):
+    """Quantile sketch of a sample in at most DIGEST_SIZE centroids
+
+    Properties:
+        n       - number of values
+        median  - the 0.5 quantile
+
+    Usage:
+        >>> foo = Digest(range(100))
+        >>> foo.quantile(0.25), foo.median
+        (24.5, 49.5)
+        >>> (foo + Digest([1000])).quantile(1)
+        1000.0
+    """
+
+    def __init__(self, lst=None):
+        self.means = []
+        self.weights = []
+        self.__call__(lst)
+
+    @classmethod
+    def from_centroids(cls, means, weights):
+        """Digest of centroids sorted by mean, compressed if there are too many."""
+        new = cls()
+        new.means, new.weights = compress(means, weights)
+        return new
+
+    @property
+    def n(self):
+        return sum(self.weights)
+
+    def update(self, x):
+        if x is None:
+            return
+        self.consume([x])
+
+    def consume(self, lst):
+        values = sorted(float(x) for x in lst if x is not None)
+        if values:
+            self.merge(values, [1] * len(values))
+
+    def merge(self, means, weights):
+        """Take in centroids."""
+        merged = sorted(zip(self.means + means, self.weights + weights), key=lambda c: c[0])
+        # equal values always share a centroid
+        means, weights = [], []
+        for mean, weight in merged:
+            if means and means[-1] == mean:
+                weights[-1] += weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+        self.means, self.weights = compress(means, weights)
+
+    def __call__(self, x):
+        if hasattr(x, '__iter__'):
+            self.consume(x)
+        else:
+            self.update(x)
+
+    def __add__(a, b):
+        new = Digest()
+        new.means, new.weights = a.means, a.weights
+        new.merge(b.means, b.weights)
+        return new
+
+    def quantile(self, q):
+        """Value below which a fraction q of the sample falls, interpolated between centroids."""
+        if not self.means:
+            return math.nan
+        target = q * self.n
+        # every centroid sits at the middle of the weight it covers
+        center = self.weights[0] / 2
+        if target <= center:
+            return self.means[0]
+        for i in range(1, len(self.means)):
+            next_center = center + (self.weights[i - 1] + self.weights[i]) / 2
+            if target <= next_center:
+                t = (target - center) / (next_center - center)
+                return self.means[i - 1] + t * (self.means[i] - self.means[i - 1])
+            center = next_center
+        return self.means[-1]
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+    def row(self):
+        """Compact json value: the means, and the weights unless they are all 1."""
+        if all(weight == 1 for weight in self.weights):
+            return {'c': self.means}
+        return {'c': self.means, 'w': self.weights}
+
+    @classmethod
+    def from_row(cls, row):
+        new = cls()
+        new.means = row['c']
+        new.weights = row.get('w', [1] * len(new.means))
+        return new
+
+    def __repr__(self):
+        return '<Digest: n={} median={}>'.format(self.n, self.median)
+
+
+def merge_digests(digests):
+    """Sum of many digests, compressed once instead of after every +."""
+    new = Digest()
+    means = [mean for digest in digests for mean in digest.means]
+    weights = [weight for digest in digests for weight in digest.weights]
+    if means:
+        new.merge(means, weights)
+    return new
+
+
+def group_digests(groups, values, ngroups):
+    """Digests of many groups at once, as group_moments computes their moments
+
+    Returns an ngroups x stats list of lists of Digests.
+    """
+    groups = np.asarray(groups, dtype=np.intp)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    digests = [[] for g in range(ngroups)]
+    if not len(groups):
+        return digests
+    for x in values.T:
+        order = np.lexsort((x, groups))
+        g, x = groups[order], x[order]
+        # runs of an equal value in a group become one centroid
+        starts = np.flatnonzero(np.r_[True, (g[1:] != g[:-1]) | (x[1:] != x[:-1])])
+        means = x[starts].tolist()
+        weights = np.diff(np.r_[starts, len(x)]).tolist()
+        run_groups = g[starts]
+        bounds = np.searchsorted(run_groups, np.arange(ngroups + 1)).tolist()
+        for group, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            digests[group].append(Digest.from_centroids(means[start:stop], weights[start:stop]))
+    return digests
+
+
+def encode_digests(digests):
+    """Digests of every key (a list of lists, key by key) as bytes."""
+    flat = [digest for stats in digests for digest in stats]
+    ndigests = len(digests[0]) if digests else 0
+    counts = np.array([len(digest.means) for digest in flat], dtype='<u4')
+    means = np.array([mean for digest in flat for mean in digest.means], dtype='<f8')
+    weights = np.array([weight for digest in flat for weight in digest.weights], dtype='<u4')
+    return HEADER.pack(MAGIC, ndigests) + counts.tobytes() + means.tobytes() + weights.tobytes()
+
+
+def decode_digests(data, nkeys, offset=0):
+    """Lists of digests of nkeys keys encoded at offset of data."""
+    magic, ndigests = HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError("not digests")
+    offset += HEADER.size
+    counts = np.frombuffer(data, '<u4', nkeys * ndigests, offset)
+    offset += counts.nbytes
+    total = int(counts.sum())
+    means = np.frombuffer(data, '<f8', total, offset).tolist()
+    weights = np.frombuffer(data, '<u4', total, offset + total * 8).tolist()
+    bounds = np.r_[0, np.cumsum(counts)].tolist()
+    flat = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        digest = Digest()
+        digest.means, digest.weights = means[start:stop], weights[start:stop]
+        flat.append(digest)
+    return [flat[k * ndigests:(k + 1) * ndigests] for k in range(nkeys)]
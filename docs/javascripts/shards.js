@@ -0,0 +1,206 @@
+// Reads the binary stats shards written by shards.py (see there for the layout)
+function decode_shard(buffer) {
+    var view = new DataView(buffer);
+    var magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== "TMS1")
+        throw new Error("not a stats shard");
+    var nkeys = view.getUint32(4, true);
+    var nstats = view.getUint32(8, true);
+    var keys_len = view.getUint32(12, true);
+
+    var keys = [];
+    var key = "";
+    var bytes = new Uint8Array(buffer, 16, keys_len);
+    for (var i = 0; i < keys_len && nkeys > 0; i++) {
+        if (bytes[i] === 0) break;
+        if (bytes[i] === 10) {
+            keys.push(key);
+            key = "";
+        }
+        else key += String.fromCharCode(bytes[i]);
+    }
+    if (nkeys > 0) keys.push(key);
+
+    // float64 little-endian, as every browser platform is
+    var moments = new Float64Array(buffer, 16 + keys_len, nkeys * nstats * 5);
+    var end = 16 + keys_len + nkeys * nstats * 5 * 8;
+    var digests = buffer.byteLength > end ? decode_digests(buffer, end, nkeys) : null;
+    var statpool = {};
+    for (var k = 0; k < nkeys; k++) {
+        var stats = [];
+        for (var s = 0; s < nstats; s++) {
+            var offset = s * 5 * nkeys + k;
+            stats.push(new Welford([
+                moments[offset],
+                moments[offset + nkeys],
+                moments[offset + 2 * nkeys],
+                moments[offset + 3 * nkeys],
+                moments[offset + 4 * nkeys]]));
+        }
+        statpool[keys[k]] = digests ? stats.concat(digests[k]) : stats;
+    }
+    return statpool;
+}
+
+// Quantile digests of nkeys keys at offset of buffer, in the format of digest.py
+function decode_digests(buffer, offset, nkeys) {
+    var view = new DataView(buffer, offset);
+    var magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== "TMD1")
+        throw new Error("not digests");
+    var ndigests = view.getUint32(4, true);
+    var counts = [];
+    var total = 0;
+    for (var i = 0; i < nkeys * ndigests; i++) {
+        counts.push(view.getUint32(8 + 4 * i, true));
+        total += counts[i];
+    }
+    var means_at = 8 + 4 * counts.length;
+    var weights_at = means_at + 8 * total;
+
+    var digests = [];
+    var c = 0;
+    for (var k = 0; k < nkeys; k++) {
+        var stats = [];
+        for (var d = 0; d < ndigests; d++) {
+            var means = [];
+            var weights = [];
+            for (var j = 0; j < counts[k * ndigests + d]; j++, c++) {
+                means.push(view.getFloat64(means_at + 8 * c, true));
+                weights.push(view.getUint32(weights_at + 4 * c, true));
+            }
+            stats.push(new Digest({c: means, w: weights}));
+        }
+        digests.push(stats);
+    }
+    return digests;
+}
+
+function load_shard(url, callback) {
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', url);
+    xhr.responseType = 'arraybuffer';
+    xhr.onload = function () {
+        callback(decode_shard(xhr.response));
+    };
+    xhr.send();
+}
+
+function get_json(url, callback) {
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', url);
+    xhr.responseType = 'json';
+    xhr.onload = function () {
+        callback(xhr.status === 200 ? xhr.response : null);
+    };
+    xhr.onerror = function () {
+        callback(null);
+    };
+    xhr.send();
+}
+
+// The characters of a key pattern at each position, up to its '.*' or '$'
+function pattern_positions(pattern) {
+    var positions = [];
+    for (var i = pattern[0] === '^' ? 1 : 0; i < pattern.length; i++) {
+        if (pattern[i] === '[') {
+            var end = pattern.indexOf(']', i);
+            positions.push(pattern.substring(i, end + 1));
+            i = end;
+        }
+        else if (pattern[i] === '$' || pattern[i] === '.' && pattern[i + 1] === '*')
+            break;
+        else positions.push(pattern[i]);
+    }
+    return positions;
+}
+
+// Names of the shards of index holding keys which can match pattern
+function shard_names(index, pattern) {
+    var positions = pattern_positions(pattern);
+    var re = new RegExp("^" + index.positions.map(function (p) {
+        return positions[p] || ".";
+    }).join("") + "$");
+    return Object.keys(index.shards).filter(function (name) {
+        return re.test(name);
+    });
+}
+
+// Statpool filled with the shards in path (written by stats.py --shards)
+// as patterns need them, or with the whole json at fallback_url when
+// there is no shard index.
+//
+// Usage:
+//     var stats = new ShardedStatpool('stats-shards', 'stats.json');
+//     stats.get(key_pattern, function (statpool) { ... });
+function ShardedStatpool(path, fallback_url) {
+    this.path = path;
+    this.fallback_url = fallback_url;
+    this.statpool = {};
+    this.index = undefined;
+    this.loaded = {};
+    this.queue = [];
+    this.busy = false;
+}
+
+// Call callback with a statpool holding every key matching pattern,
+// callbacks in the order get was called
+ShardedStatpool.prototype.get = function (pattern, callback) {
+    this.queue.push([pattern, callback]);
+    this.next();
+};
+
+ShardedStatpool.prototype.next = function () {
+    if (this.busy || !this.queue.length)
+        return;
+    var self = this;
+    var request = this.queue.shift();
+    this.busy = true;
+    this.load(request[0], function () {
+        self.busy = false;
+        request[1](self.statpool);
+        self.next();
+    });
+};
+
+ShardedStatpool.prototype.load = function (pattern, done) {
+    var self = this;
+    if (this.index === undefined) {
+        get_json(this.path + '/index.json', function (index) {
+            self.index = index;
+            if (index === null)
+                self.load_all(done);
+            else
+                self.load(pattern, done);
+        });
+        return;
+    }
+    // without an index everything is loaded already
+    var names = this.index === null ? [] : shard_names(this.index, pattern).filter(function (name) {
+        return !self.loaded[name];
+    });
+    var left = names.length;
+    if (!left)
+        return done();
+    names.forEach(function (name) {
+        self.loaded[name] = true;
+        load_shard(self.path + '/' + name + '.bin', function (shard) {
+            for (var key in shard)
+                self.statpool[key] = shard[key];
+            if (--left === 0)
+                done();
+        });
+    });
+};
+
+ShardedStatpool.prototype.load_all = function (done) {
+    var self = this;
+    get_json(this.fallback_url, function (data) {
+        for (var key in data || {}) {
+            self.statpool[key] = data[key].map(function (stat) {
+                return stat.c ? new Digest(stat) : new Welford(stat);
+            });
+        }
+        done();
+    });
+};
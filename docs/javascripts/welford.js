@@ -65,3 +65,83 @@ Welford.prototype.skewness = function () {
 Welford.prototype.kurtosis = function () {
     return this.n * this.M4 / (this.M2 * this.M2) - 3
 }
+
+// Quantile sketch written by digest.py: {c: centroid means, w: their weights (all 1 if missing)}
+function Digest(init) {
+    this.means = init.c;
+    this.weights = init.w || init.c.map(function () { return 1; });
+}
+
+// centroids kept per digest, DIGEST_SIZE of digest.py
+var DIGEST_SIZE = 64;
+
+// Merge sorted centroids down to at most size of them, like compress in digest.py
+function compress(means, weights, size) {
+    if (means.length <= size)
+        return [means, weights];
+    var total = weights.reduce(function (a, b) { return a + b; }, 0);
+    var scale = size / (2 * Math.PI);
+    function limit(q) {
+        var k = Math.min(scale * Math.asin(2 * q - 1) + 1, size / 4);
+        return (Math.sin(k / scale) + 1) / 2 * total;
+    }
+
+    var new_means = [means[0]], new_weights = [weights[0]];
+    var done = 0;
+    var bound = limit(0);
+    for (var i = 1; i < means.length; i++) {
+        var last = new_means.length - 1;
+        if (done + new_weights[last] + weights[i] <= bound) {
+            var w = new_weights[last] + weights[i];
+            new_means[last] += (means[i] - new_means[last]) * weights[i] / w;
+            new_weights[last] = w;
+        }
+        else {
+            done += new_weights[last];
+            bound = limit(done / total);
+            new_means.push(means[i]);
+            new_weights.push(weights[i]);
+        }
+    }
+    return [new_means, new_weights];
+}
+
+Digest.prototype.combine = function (b) {
+    var centroids = [];
+    [this, b].forEach(function (d) {
+        for (var i = 0; i < d.means.length; i++)
+            centroids.push([d.means[i], d.weights[i]]);
+    });
+    centroids.sort(function (x, y) { return x[0] - y[0]; });
+    // equal values always share a centroid
+    var means = [], weights = [];
+    centroids.forEach(function (c) {
+        if (means.length && means[means.length - 1] == c[0])
+            weights[weights.length - 1] += c[1];
+        else {
+            means.push(c[0]);
+            weights.push(c[1]);
+        }
+    });
+    var compressed = compress(means, weights, DIGEST_SIZE);
+    return new Digest({c: compressed[0], w: compressed[1]});
+}
+
+Digest.prototype.quantile = function (q) {
+    var n = this.weights.reduce(function (a, b) { return a + b; }, 0);
+    var target = q * n;
+    var center = this.weights[0] / 2;
+    if (target <= center)
+        return this.means[0];
+    for (var i = 1; i < this.means.length; i++) {
+        var next_center = center + (this.weights[i - 1] + this.weights[i]) / 2;
+        if (target <= next_center)
+            return this.means[i - 1] + (target - center) / (next_center - center) * (this.means[i] - this.means[i - 1]);
+        center = next_center;
+    }
+    return this.means[this.means.length - 1];
+}
+
+Digest.prototype.median = function () {
+    return this.quantile(0.5);
+}
@@ -65,3 +65,41 @@ Welford.prototype.skewness = function () {
 Welford.prototype.kurtosis = function () {
     return this.n * this.M4 / (this.M2 * this.M2) - 3
 }
+
+// Quantile sketch written by digest.py: {c: centroid means, w: their weights (all 1 if missing)}
+function Digest(init) {
+    this.means = init.c;
+    this.weights = init.w || init.c.map(function () { return 1; });
+}
+
+Digest.prototype.combine = function (b) {
+    var centroids = [];
+    [this, b].forEach(function (d) {
+        for (var i = 0; i < d.means.length; i++)
+            centroids.push([d.means[i], d.weights[i]]);
+    });
+    centroids.sort(function (x, y) { return x[0] - y[0]; });
+    return new Digest({
+        c: centroids.map(function (c) { return c[0]; }),
+        w: centroids.map(function (c) { return c[1]; })
+    });
+}
+
+Digest.prototype.quantile = function (q) {
+    var n = this.weights.reduce(function (a, b) { return a + b; }, 0);
+    var target = q * n;
+    var center = this.weights[0] / 2;
+    if (target <= center)
+        return this.means[0];
+    for (var i = 1; i < this.means.length; i++) {
+        var next_center = center + (this.weights[i - 1] + this.weights[i]) / 2;
+        if (target <= next_center)
+            return this.means[i - 1] + (target - center) / (next_center - center) * (this.means[i] - this.means[i - 1]);
+        center = next_center;
+    }
+    return this.means[this.means.length - 1];
+}
+
+Digest.prototype.median = function () {
+    return this.quantile(0.5);
+}
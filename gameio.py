@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""Readers for Terra Mystica Online game dumps"""
+
+import bz2
+import codecs
+import gzip
+import io
+import json
+import lzma
+import mmap
+import re
+
+import jsonio
+
+CHUNK_SIZE = 1 << 20
+# plain dumps up to this size are decoded in one call by a fast JSON backend;
+# the decoded games take about 9 times the size of the file, so real
+# months are always streamed to keep the memory bounded
+BULK_SIZE = 4 << 20
+# read size of the compressed file, and of the decompressed stream
+BUFFER_SIZE = 1 << 20
+
+# suffix: decompressed binary stream of a binary file object
+COMPRESSIONS = {
+    '.gz': lambda f: gzip.GzipFile(fileobj=f),
+    '.bz2': bz2.BZ2File,
+    '.xz': lzma.LZMAFile,
+}
+GAME_SUFFIXES = ('.json',) + tuple('.json' + suffix for suffix in COMPRESSIONS)
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def game_suffix(game_fn):
+    """'.json', '.json.gz', ... of a game dump, None if it is not one."""
+    for suffix in GAME_SUFFIXES:
+        if game_fn.name.endswith(suffix):
+            return suffix
+    return None
+
+
+def game_name(game_fn):
+    """Name of a game dump without its suffixes: 2017-03 for 2017-03.json.xz."""
+    return game_fn.name[:-len(game_suffix(game_fn) or '')] or game_fn.name
+
+
+class MappedFile(object):
+    """Read-only text file over an mmap
+
+    Chunks are decoded straight out of the mapping, skipping the copy
+    through a read buffer.
+    """
+
+    def __init__(self, game_fn, encoding='utf-8'):
+        with open(game_fn, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.map)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.pos = 0
+
+    def read(self, size=-1):
+        start = self.pos
+        self.pos = len(self.data) if size < 0 else min(len(self.data), start + size)
+        return self.decoder.decode(self.data[start:self.pos], final=self.pos == len(self.data))
+
+    def close(self):
+        self.data.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompressedFile(object):
+    """Text file decompressed on the fly, reading BUFFER_SIZE at a time"""
+
+    def __init__(self, game_fn, opener, encoding='utf-8'):
+        self.raw = open(game_fn, 'rb', buffering=BUFFER_SIZE)
+        self.text = io.TextIOWrapper(io.BufferedReader(opener(self.raw), BUFFER_SIZE), encoding=encoding)
+
+    def read(self, size=-1):
+        return self.text.read(size)
+
+    def close(self):
+        # the decompressor leaves a file object it was given open
+        self.text.close()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_game_file(game_fn):
+    """Open a game dump (.json, .json.gz, .json.bz2 or .json.xz) in text mode.
+
+    Compressed dumps are decompressed as a stream, uncompressed ones are
+    memory-mapped.
+    """
+    opener = COMPRESSIONS.get(game_fn.suffix)
+    if opener is not None:
+        return CompressedFile(game_fn, opener)
+    if game_fn.stat().st_size:
+        return MappedFile(game_fn)
+    # an empty file cannot be mapped
+    return open(game_fn, encoding='utf-8')
+
+
+def iter_games(game_file, chunk_size=CHUNK_SIZE):
+    """Yield games one at a time from a file holding a JSON array of games.
+
+    Only the game being decoded (plus one read chunk) is held in memory,
+    so a monthly dump never has to be materialized as a whole.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    # what comes next: '[', the first game or ']', a game, or ',' or ']'
+    expect = '['
+    eof = False
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            c = buf[pos]
+            if expect == '[':
+                if c != '[':
+                    raise ValueError("game file is not a JSON array")
+                expect = 'first'
+                pos += 1
+                continue
+            if expect == ',':
+                if c == ']':
+                    return
+                if c != ',':
+                    raise ValueError(f"expected ',' or ']' after a game, not {c!r}")
+                expect = 'game'
+                pos += 1
+                continue
+            if c == ']':
+                if expect == 'first':
+                    return
+                raise ValueError("trailing ',' before ']'")
+            try:
+                game, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # a value ending with the buffer may be a number going on in the next chunk
+                if end < len(buf) or eof:
+                    yield game
+                    pos = end
+                    expect = ','
+                    continue
+        elif eof:
+            raise ValueError("unexpected end of game file")
+
+        # the next game is incomplete, read more of the file
+        chunk = game_file.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def read_games(game_fn):
+    """Yield the games of a dump, decoded the fastest way available.
+
+    With a fast JSON backend, small plain dumps (up to BULK_SIZE) are
+    decoded in one call straight from their mapping. Anything else is
+    streamed through iter_games, holding one game at a time.
+    """
+    if jsonio.fast() and game_fn.suffix == '.json' and 0 < game_fn.stat().st_size <= BULK_SIZE:
+        with open(game_fn, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with memoryview(data) as view:
+                games = jsonio.loads(view)
+        if not isinstance(games, list):
+            raise ValueError("game file is not a JSON array")
+        yield from games
+        return
+
+    with open_game_file(game_fn) as game_file:
+        yield from iter_games(game_file)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""JSON backends: orjson when it is installed, the json module otherwise
+
+Every backend is a (loads, dumps) pair, dumps returning bytes and taking
+indent=True for two space indentation or False for compact output.
+"""
+
+import json
+from itertools import islice
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(data):
+    if not isinstance(data, str):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def _json_dumps(obj, indent=False):
+    if indent:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def _orjson_dumps(obj, indent=False):
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+
+BACKENDS = {'json': (_json_loads, _json_dumps)}
+if orjson is not None:
+    BACKENDS['orjson'] = (orjson.loads, _orjson_dumps)
+
+# the fastest backend installed
+backend = 'orjson' if 'orjson' in BACKENDS else 'json'
+
+
+def use(name):
+    """Switch to the named backend."""
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend {name} is not installed")
+    backend = name
+
+
+def fast():
+    """Whether the backend beats the json module (which iter_games streams with)."""
+    return backend != 'json'
+
+
+def loads(data):
+    """Decode str, bytes or a buffer such as an mmap."""
+    return BACKENDS[backend][0](data)
+
+
+def dumps(obj, indent=False):
+    return BACKENDS[backend][1](obj, indent)
+
+
+def statpool_rows(statpool):
+    """Statpool as plain lists: a Welford with n=1 is its value, others [n, M1, M2, M3, M4].
+
+    A Digest is its row(), {'c': means, 'w': weights}.
+    """
+    from digest import Digest  # NumPy is only imported once there is a statpool to write
+    return {key: [s.row() if isinstance(s, Digest) else s.M1 if s.n == 1 else [s.n, s.M1, s.M2, s.M3, s.M4]
+                  for s in stats]
+            for key, stats in statpool.items()}
+
+
+def dumps_statpool(statpool, indent=True):
+    """Encode a statpool in one call, without a default hook per Welford."""
+    return dumps(statpool_rows(statpool), indent)
+
+
+def write_statpool(f, items, indent=True, chunk=4096):
+    """Write the (key, stats) items of a statpool into the binary file f, chunk keys at a time.
+
+    The output is what dumps_statpool gives for the same key order, but
+    only a chunk of keys is ever encoded at once. Returns the number of
+    keys and bytes written.
+    """
+    open_, sep, close = (b'{\n', b',\n', b'\n}') if indent else (b'{', b',', b'}')
+    keys = size = 0
+    items = iter(items)
+    while True:
+        rows = dict(islice(items, chunk))
+        if not rows:
+            break
+        # the encoded chunk without its braces, joined to the ones before
+        data = dumps_statpool(rows, indent)[len(open_):-len(close)]
+        f.write(sep if keys else open_)
+        f.write(data)
+        size += (len(sep) if keys else len(open_)) + len(data)
+        keys += len(rows)
+    data = close if keys else b'{}'
+    f.write(data)
+    return keys, size + len(data)
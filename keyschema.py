@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""Stats keys declared as a list of dimensions
+
+A KeySchema lists the dimensions of a key in order, each reading one
+record column and encoding it with a fixed table of strings. It encodes
+all records at once from their columns, one table lookup per dimension,
+and describes itself as a layout (the start, width and values of every
+dimension) for the web pages and query tools to build patterns from.
+
+Usage:
+    schema = KeySchema('stats', [Code('map', 'map', MAP_CHARS), Digits('numplayers', 'numplayers')])
+    keys = schema.encode(records)
+    schema(record)  # the key of one Record
+    schema.pattern(numplayers='4')  # '.4$'
+"""
+
+import numpy as np
+
+# str(v) of every int8 value, at v + 128
+DECIMAL = np.array([str(v) for v in range(-128, 128)])
+
+
+def key_columns(records):
+    """The columns of records with the rating bucket of every record as 'rating'."""
+    columns = dict(records.columns)
+    if records.ratings is None:
+        columns['rating'] = np.zeros(len(records), dtype=np.int8)
+    else:
+        columns['rating'] = records.ratings[records.columns['user']]
+    return columns
+
+
+def record_columns(record):
+    """key_columns of a single Record, with its rating attribute."""
+    columns = {name: column[record.i:record.i + 1] for name, column in record.records.columns.items()}
+    columns['rating'] = np.array([record.rating], dtype=np.int8)
+    return columns
+
+
+class Dimension(object):
+    """One or more key characters encoding a record column
+
+    column is the name of the column, index selects from a column with
+    several values per record (an int, a slice or a tuple of them).
+    """
+
+    encoding = None
+
+    def __init__(self, name, column, index=None, width=1):
+        self.name = name
+        self.column = column
+        self.index = index
+        self.width = width
+
+    def values(self, columns):
+        values = columns[self.column]
+        if self.index is not None:
+            values = values[(slice(None),) + (self.index if isinstance(self.index, tuple) else (self.index,))]
+        return values
+
+    def encode(self, columns):
+        """Strings of the dimension for every row of columns."""
+        raise NotImplementedError
+
+    def layout(self):
+        return {'name': self.name, 'column': self.column, 'width': self.width, 'encoding': self.encoding}
+
+
+class Code(Dimension):
+    """Value v written as chars[v], all chars of the same length"""
+
+    encoding = 'code'
+
+    def __init__(self, name, column, chars, index=None):
+        super().__init__(name, column, index, len(chars[0]))
+        self.chars = np.array(chars)
+
+    def encode(self, columns):
+        return self.chars[self.values(columns)]
+
+    def layout(self):
+        return dict(super().layout(), values=self.chars.tolist())
+
+
+class Digits(Dimension):
+    """Values written in decimal, one character per value (0-9)
+
+    index can select count values per record. flag writes 1 for any
+    value set, 0 otherwise. A value past 9 or below 0 widens the key as
+    str() always did, so keys stay as they were.
+    """
+
+    encoding = 'decimal'
+
+    def __init__(self, name, column, index=None, count=1, flag=False):
+        super().__init__(name, column, index, count)
+        self.flag = flag
+
+    def encode(self, columns):
+        values = self.values(columns)
+        if self.flag:
+            values = values != 0
+        strings = DECIMAL[values.astype(np.int16) + 128]
+        if strings.ndim == 1:
+            return strings
+        keys = strings[:, 0]
+        for i in range(1, strings.shape[1]):
+            keys = np.char.add(keys, strings[:, i])
+        return keys
+
+    def layout(self):
+        return dict(super().layout(), flag=self.flag)
+
+
+class Set(Dimension):
+    """chars[i] for every value i of the column which is at most below, in order
+
+    Variable width, so it can only be the last dimension.
+    """
+
+    encoding = 'set'
+
+    def __init__(self, name, column, chars, below):
+        super().__init__(name, column, width=None)
+        self.chars = chars
+        self.below = below
+
+    def encode(self, columns):
+        included = self.values(columns) <= self.below
+        keys = np.where(included[:, 0], self.chars[0], '')
+        for i in range(1, len(self.chars)):
+            keys = np.char.add(keys, np.where(included[:, i], self.chars[i], ''))
+        return keys
+
+    def layout(self):
+        return dict(super().layout(), values=list(self.chars), below=self.below)
+
+
+class KeySchema(object):
+    """Key of a view, the concatenation of its dimensions
+
+    Callable on a Record like the hand written key functions it replaces.
+    """
+
+    def __init__(self, name, dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        for dimension in dimensions[:-1]:
+            if dimension.width is None:
+                raise ValueError(f"variable width dimension {dimension.name} has to be the last one")
+        self.starts = {}
+        start = 0
+        for dimension in dimensions:
+            self.starts[dimension.name] = start
+            start += dimension.width or 0
+
+    def __call__(self, record):
+        return str(self.encode_columns(record_columns(record), 1)[0])
+
+    def encode_columns(self, columns, n, dimensions=None):
+        keys = np.full(n, '')
+        for dimension in self.dimensions if dimensions is None else dimensions:
+            keys = np.char.add(keys, dimension.encode(columns))
+        return keys
+
+    def dimension(self, name):
+        return next(dimension for dimension in self.dimensions if dimension.name == name)
+
+    def encode(self, records):
+        """Keys of all records, as a str array."""
+        return self.encode_columns(key_columns(records), len(records))
+
+    def split(self, records, name):
+        """Keys of all records without the dimension name: the parts before and after it."""
+        i = self.dimensions.index(self.dimension(name))
+        columns = key_columns(records)
+        return (self.encode_columns(columns, len(records), self.dimensions[:i]),
+                self.encode_columns(columns, len(records), self.dimensions[i + 1:]))
+
+    def index(self, records):
+        """Distinct keys of records in order of appearance, and the key id of every record."""
+        keys, first, groups = np.unique(self.encode(records), return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        ids = np.empty_like(order)
+        ids[order] = np.arange(len(order))
+        return keys[order].tolist(), ids[groups.reshape(-1)]
+
+    def position(self, name):
+        """Start of a dimension in the key."""
+        return self.starts[name]
+
+    def mask(self, *names):
+        """Roll-up mask wildcarding the dimensions names ('1' keeps a position, '.' drops it)."""
+        mask = ''
+        for dimension in self.dimensions:
+            width = len(dimension.chars) if dimension.width is None else dimension.width
+            mask += ('.' if dimension.name in names else '1') * width
+        return mask
+
+    def pattern(self, **values):
+        """Key pattern matching the given dimension values, any value elsewhere."""
+        pattern = ''
+        for dimension in self.dimensions:
+            if dimension.width is None:
+                return pattern + '.*' if dimension.name not in values else pattern + values[dimension.name] + '$'
+            pattern += values.get(dimension.name, '.' * dimension.width)
+        return pattern + '$'
+
+    def layout(self):
+        """Machine readable description of the key."""
+        dimensions = []
+        for dimension in self.dimensions:
+            dimensions.append(dict(dimension.layout(), start=self.starts[dimension.name]))
+        return {'name': self.name, 'dimensions': dimensions}
+
+
+class Stat(object):
+    """Statfunc reading a column, get_statpools takes the values of all records at once"""
+
+    def __init__(self, column):
+        self.column = column
+
+    def __call__(self, record):
+        return float(getattr(record, self.column))
+
+    def values(self, records):
+        return np.asarray(records.columns[self.column], dtype=float)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""Statpools kept per game file, merged into any range of months
+
+Every game file has one partition per view (get_key, get_key2, ...),
+stored in the binary shard format unless the store is given another
+encoding (stats.py keeps players.PlayerPool partials). index.json
+records what each partition was computed from, so only new or changed
+game files are ever aggregated again, and the stats of months A..B (or
+of everything) are a merge of small partitions.
+"""
+
+import json
+import shutil
+
+from rolling import add_pool
+from shards import decode_shard, encode_shard
+
+
+def partition_month(name):
+    """YYYY-MM of a partition, named after its game file."""
+    return name[:7]
+
+
+class PartitionStore(object):
+    """Directory of partitions, name.view.bin, and their index.json
+
+    encode turns what save is given into bytes, decode bytes into the
+    statpool load returns.
+
+    Usage:
+        store = PartitionStore(path)
+        if store.version(game_fn.name) != version:
+            store.save(game_fn.name, {'stats': statpool, ...}, version)
+            store.save_index()
+        store.merge('stats', '2017-01', '2017-06')
+    """
+
+    def __init__(self, path, encode=encode_shard, decode=decode_shard):
+        self.path = path
+        self.encode = encode
+        self.decode = decode
+        try:
+            with open(path / 'index.json') as f:
+                self.partitions = json.load(f)['partitions']
+        except FileNotFoundError:
+            self.partitions = {}
+
+    def filename(self, name, view):
+        return self.path / f'{name}.{view}.bin'
+
+    def version(self, name):
+        """What the partition was computed from, None if there is no partition."""
+        return self.partitions.get(name, {}).get('version')
+
+    def names(self, start=None, end=None):
+        """Partitions of the months start..end (both included, YYYY-MM), in order."""
+        return [name for name in sorted(self.partitions)
+                if (start is None or partition_month(name) >= start) and (end is None or partition_month(name) <= end)]
+
+    def save(self, name, statpools, version):
+        """Write the statpool of every view of a partition."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        for view, statpool in statpools.items():
+            with open(self.filename(name, view), 'wb') as f:
+                f.write(self.encode(statpool))
+        self.partitions[name] = {'version': version, 'keys': {view: len(statpool) for view, statpool in statpools.items()}}
+
+    def load(self, name, view):
+        with open(self.filename(name, view), 'rb') as f:
+            return self.decode(f.read())
+
+    def remove(self, name):
+        for view in self.partitions.pop(name)['keys']:
+            self.filename(name, view).unlink()
+
+    def clear(self):
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.partitions = {}
+
+    def save_index(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / 'index.json', 'w+') as f:
+            json.dump({'partitions': self.partitions}, f, indent=2)
+
+    def merge(self, view, start=None, end=None, into=None):
+        """Statpool of view over the months start..end, by merging their partitions.
+
+        into is a spill.SpillPool to merge them into instead of a dict.
+        """
+        statpool = {} if into is None else into
+        for name in self.names(start, end):
+            if into is None:
+                add_pool(statpool, self.load(name, view))
+            else:
+                into.add(self.load(name, view))
+        return statpool
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""Statpools with the rating of the players factored out of their keys
+
+A PlayerPool keeps the moments of every (key, player) pair, with the
+rating dimension left out of the key. The statpool for any ratings.json
+or rating thresholds is then a re-merge of these partials: every player
+is mapped to a bucket, and the partials sharing a key and a bucket are
+merged with merge_group_moments, without reading a game again.
+"""
+
+import io
+
+import numpy as np
+
+from digest import decode_digests, encode_digests, group_digests, merge_digests
+from welford import Welford, group_moments, merge_group_moments
+
+
+class PlayerPool(object):
+    """Partial moments of (key, player) pairs of a KeySchema view
+
+    prefixes, suffixes - the key before and after the rating, per base key
+    users              - user names
+    base, user         - base key and user of every partial
+    moments            - partials x stats x 5 array
+    chars              - key characters of every rating bucket
+    digests            - quantile digests of every partial, or None
+
+    Usage:
+        pool = PlayerPool.build(get_key, records, values)
+        statpool = pool.statpool(get_ratings(pool.users))
+    """
+
+    def __init__(self, prefixes, suffixes, users, base, user, moments, chars, digests=None):
+        self.prefixes = prefixes
+        self.suffixes = suffixes
+        self.users = users
+        self.base = base
+        self.user = user
+        self.moments = moments
+        self.chars = chars
+        self.digests = digests
+
+    def __len__(self):
+        return len(self.moments)
+
+    @classmethod
+    def build(cls, schema, records, values, dimension='rating', quantiles=False, split=None):
+        """Partials of records grouped by schema key without dimension, and user.
+
+        values are the (records x stats) samples to aggregate, split is
+        schema.split(records, dimension) when the caller encoded it already.
+        """
+        prefixes, suffixes = schema.split(records, dimension) if split is None else split
+        _, first, base = np.unique(np.char.add(np.char.add(prefixes, '\n'), suffixes),
+                                   return_index=True, return_inverse=True)
+        base = base.reshape(-1)
+        user = records.columns['user']
+        _, first_pair, group = np.unique(base * len(records.users) + user, return_index=True, return_inverse=True)
+        # partials in order of their first record
+        order = np.argsort(first_pair, kind='stable')
+        ids = np.empty_like(order)
+        ids[order] = np.arange(len(order))
+        group = ids[group.reshape(-1)]
+        rows = first_pair[order]
+
+        chars = schema.dimension(dimension).encode({dimension: np.arange(10, dtype=np.int8)})
+        digests = group_digests(group, values, len(rows)) if quantiles else None
+        return cls(prefixes[first], suffixes[first], np.asarray(records.users), base[rows], user[rows],
+                   group_moments(group, values, len(rows)), chars, digests)
+
+    def statpool(self, buckets):
+        """Statpool with the rating bucket of every user in buckets (an array over users)."""
+        final = self.base * len(self.chars) + np.asarray(buckets, dtype=np.intp)[self.user]
+        _, first, group = np.unique(final, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        ids = np.empty_like(order)
+        ids[order] = np.arange(len(order))
+        group = ids[group.reshape(-1)]
+        rows = first[order]
+
+        base = self.base[rows]
+        keys = np.char.add(np.char.add(self.prefixes[base], self.chars[final[rows] % len(self.chars)]),
+                           self.suffixes[base])
+        moments = merge_group_moments(group, self.moments, len(rows))
+        statpool = {key: [Welford.from_moments(*m) for m in stats]
+                    for key, stats in zip(keys.tolist(), moments.tolist())}
+        if self.digests is not None:
+            members = np.split(np.argsort(group, kind='stable'), np.cumsum(np.bincount(group, minlength=len(rows)))[:-1])
+            for stats, partials in zip(statpool.values(), members):
+                stats.extend(merge_digests(digests) for digests in zip(*(self.digests[p] for p in partials.tolist())))
+        return statpool
+
+    def encode(self):
+        arrays = {name: getattr(self, name) for name in ('prefixes', 'suffixes', 'users', 'base', 'user', 'moments', 'chars')}
+        if self.digests is not None:
+            arrays['digests'] = np.frombuffer(encode_digests(self.digests), np.uint8)
+        f = io.BytesIO()
+        np.savez(f, **arrays)
+        return f.getvalue()
+
+    @classmethod
+    def decode(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        digests = None
+        if 'digests' in arrays:
+            digests = decode_digests(arrays['digests'].tobytes(), len(arrays['moments']))
+        return cls(*(arrays[name] for name in ('prefixes', 'suffixes', 'users', 'base', 'user', 'moments', 'chars')),
+                   digests)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Indexed queries over the keys of a statpool
+
+Answers the key patterns built by the web pages (literal characters,
+'.', classes such as [1-3] or [abd] and a '.*' before the optional
+favors) without testing a regex against every key.
+"""
+
+import argparse
+import re
+
+import numpy as np
+
+import jsonio
+from digest import Digest, merge_digests
+from welford import Welford, merge_moments
+
+_TOKENS = re.compile(r'\[([^\]]*)\]|(\.\*)|(.)')
+
+ANY = None
+STAR = '*'
+END = '$'
+
+
+def parse_class(chars):
+    """Expand the inside of a [...] class into its characters."""
+    result = set()
+    i = 0
+    while i < len(chars):
+        if i + 2 < len(chars) and chars[i + 1] == '-':
+            result.update(chr(c) for c in range(ord(chars[i]), ord(chars[i + 2]) + 1))
+            i += 3
+        else:
+            result.add(chars[i])
+            i += 1
+    return result
+
+
+def parse_pattern(pattern):
+    """Tokens of a key pattern, one per key position (or STAR/END)."""
+    tokens = []
+    for i, m in enumerate(_TOKENS.finditer(pattern)):
+        chars, star, char = m.groups()
+        if chars is not None:
+            tokens.append(parse_class(chars))
+        elif star:
+            tokens.append(STAR)
+        elif char == '^' and i == 0:
+            continue
+        elif char == '$' and m.end() == len(pattern):
+            tokens.append(END)
+        elif char == '.':
+            tokens.append(ANY)
+        elif char in '*+?()|{}\\':
+            raise ValueError(f"unsupported key pattern: {pattern}")
+        else:
+            tokens.append({char})
+    return tokens
+
+
+class KeyIndex(object):
+    """Positional inverted index of statpool keys
+
+    For every key position and character the keys having it there are
+    kept as a packed bitmap; a pattern is answered by OR-ing the bitmaps
+    of a position and AND-ing positions, then the Welfords of the matching
+    keys are merged in one vectorized step.
+
+    Usage:
+        index = KeyIndex(statpool)
+        score, margin = index.query('a0100000001.[hk]..')
+    """
+
+    def __init__(self, statpool):
+        self.keys = list(statpool)
+        first = next(iter(statpool.values()), [])
+        nstats = sum(isinstance(s, Welford) for s in first)
+        self.moments = np.array(
+            [[(s.n, s.M1, s.M2, s.M3, s.M4) for s in stats[:nstats]] for stats in statpool.values()],
+            dtype=float).reshape(len(self.keys), nstats, 5)
+        # the quantile digests after the moments, if any
+        self.digests = [stats[nstats:] for stats in statpool.values()] if len(first) > nstats else None
+
+        encoded = [key.encode() for key in self.keys]
+        self.width = max(map(len, encoded), default=0)
+        chars = np.frombuffer(b''.join(key.ljust(self.width, b'\0') for key in encoded), np.uint8)
+        chars = chars.reshape(len(self.keys), self.width)
+        self.lengths = np.array(list(map(len, encoded)), dtype=np.int32)
+
+        self.everything = np.packbits(np.ones(len(self.keys), dtype=bool))
+        self.nothing = np.zeros_like(self.everything)
+        # postings[p][c]: keys with character c at position p
+        self.postings = []
+        self.present = []
+        for p in range(self.width):
+            column = chars[:, p]
+            self.postings.append({chr(c): np.packbits(column == c) for c in np.unique(column) if c})
+            self.present.append(np.packbits(self.lengths > p))
+
+    def position(self, p, token):
+        """Bitmap of the keys matching token at position p."""
+        if token is END:
+            return np.packbits(self.lengths == p)
+        if p >= self.width:
+            return self.nothing
+        if token is ANY:
+            return self.present[p]
+        bits = self.nothing
+        for char in token:
+            if char in self.postings[p]:
+                bits = bits | self.postings[p][char]
+        return bits
+
+    def _match(self, tokens, p=0):
+        bits = self.everything
+        for j, token in enumerate(tokens):
+            if token is STAR:
+                rest = tokens[j + 1:]
+                tail = self.nothing
+                for q in range(p + j, self.width + 1):
+                    tail = tail | self._match(rest, q)
+                return bits & tail
+            bits = bits & self.position(p + j, token)
+        return bits
+
+    def match(self, pattern):
+        """Indices of the keys starting with pattern, like RegExp('^' + pattern)."""
+        return self.match_tokens(parse_pattern(pattern))
+
+    def match_tokens(self, tokens):
+        return np.flatnonzero(np.unpackbits(self._match(tokens), count=len(self.keys)))
+
+    def query(self, pattern):
+        """Merged stats of every key matching pattern, None if no key does."""
+        return self.query_tokens(parse_pattern(pattern))
+
+    def query_tokens(self, tokens):
+        rows = self.match_tokens(tokens)
+        if not len(rows):
+            return None
+        stats = [Welford.from_moments(*m) for m in merge_moments(self.moments[rows]).tolist()]
+        if self.digests is not None:
+            stats += [merge_digests(digests) for digests in zip(*(self.digests[row] for row in rows.tolist()))]
+        return stats
+
+
+def load_statpool(filename):
+    """Read back a statpool written by save_stats."""
+    with open(filename, 'rb') as f:
+        data = jsonio.loads(f.read())
+    return {key: [Welford.from_moments(*s) if isinstance(s, list) else Digest.from_row(s) if isinstance(s, dict)
+                  else Welford.from_moments(1, s, 0, 0, 0) for s in stats]
+            for key, stats in data.items()}
+
+
+def layout_pattern(layout, fields):
+    """Key pattern of a view of docs/layout.json from 'name=value,...' fields, any value elsewhere."""
+    values = dict(field.split('=', 1) for field in fields.split(',') if field)
+    pattern = ''
+    for dimension in layout['dimensions']:
+        if dimension['width'] is None:
+            return pattern + values.pop(dimension['name']) + '$' if dimension['name'] in values else pattern + '.*'
+        pattern += values.pop(dimension['name'], '.' * dimension['width'])
+    if values:
+        raise ValueError(f"no dimension {', '.join(values)} in {layout['name']}")
+    return pattern + '$'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query a statpool written by stats.py")
+    parser.add_argument('statpool', help="stats json, e.g. docs/stats.json")
+    parser.add_argument('patterns', nargs='+', help="key patterns, as built by the web page")
+    parser.add_argument('--layout', metavar='VIEW',
+                        help="patterns are name=value,... fields of VIEW in docs/layout.json, e.g. faction=b,numplayers=4")
+    args = parser.parse_args()
+
+    patterns = args.patterns
+    if args.layout:
+        with open('docs/layout.json', 'rb') as f:
+            layout = jsonio.loads(f.read())[args.layout]
+        patterns = [layout_pattern(layout, fields) for fields in patterns]
+
+    index = KeyIndex(load_statpool(args.statpool))
+    for pattern in patterns:
+        stats = index.query(pattern)
+        if stats is None:
+            print(pattern, "no match")
+            continue
+        score, margin = stats[:2]
+        line = f"n={score.n} score={score.mean:.2f}+-{score.std:.2f} margin={margin.mean:.2f}+-{margin.std:.2f}"
+        if len(stats) > 2:
+            score, margin = stats[2:4]
+            line += f" score median={score.median:.2f} p10-p90={score.quantile(.1):.2f}-{score.quantile(.9):.2f}" \
+                    f" margin median={margin.median:.2f}"
+        print(pattern, line)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""Columnar storage of parsed faction records"""
+
+import json
+import shutil
+
+import numpy as np
+
+# options which take part in the stats keys, in column order
+OPTIONS = (
+    'errata-cultist-power',
+    'mini-expansion-1',
+    'shipping-bonus',
+    'fire-and-ice-final-scoring',
+    'fire-and-ice-factions/ice',
+    'fire-and-ice-factions/volcano',
+    'fire-and-ice-factions/variable',
+    'variable-turn-order',
+    'temple-scoring-tile',
+)
+
+# name: (dtype, shape of one record)
+COLUMNS = {
+    'game': (np.int32, ()),  # index into Records.games
+    'user': (np.int32, ()),  # index into Records.users
+    'faction': (np.int8, ()),  # faction id, index into stats.FACTIONS
+    'score': (np.int16, ()),
+    'margin': (np.float64, ()),
+    'numplayers': (np.int8, ()),
+    'rank_in_game': (np.int8, ()),
+    'map': (np.int8, ()),  # map id, index into stats.MAPDICT
+    'period': (np.int16, ()),  # two digit year * 16 + month
+    'last_update': (np.int64, ()),  # of the game, as seen.update_id
+    'options': (np.int8, (len(OPTIONS),)),  # option value, 0 if unset
+    'score_tiles': (np.int8, (6,)),  # SCORE tile of rounds 1-6, -1 if unknown
+    'orders': (np.int8, (7,)),  # passing order of rounds 0-6, 0 if unknown
+    'builts': (np.int8, (5, 7)),
+    'favs': (np.int8, (12,)),
+    'bonus': (np.int8, (7,)),  # BON of rounds 0-6, -1 if none
+    'leech_pw': (np.int8, (7,)),
+    'all_bons': (np.int8, (11,)),
+}
+
+# value of columns with no data, where it is not 0
+DEFAULTS = {
+    'score_tiles': -1,
+    'bonus': -1,
+}
+
+
+def empty_columns(n):
+    columns = {name: np.zeros((n,) + shape, dtype) for name, (dtype, shape) in COLUMNS.items()}
+    for name, value in DEFAULTS.items():
+        columns[name][:] = value
+    return columns
+
+
+class Record(object):
+    """One row of Records, with the attributes the key functions use"""
+
+    def __init__(self, records, i):
+        self.records = records
+        self.i = i
+        columns = records.columns
+        self.game_id = str(records.games[columns['game'][i]])
+        self.user = int(columns['user'][i])
+        self.rating = 0 if records.ratings is None else int(records.ratings[self.user])
+        self.faction = int(columns['faction'][i])
+        self.score = int(columns['score'][i])
+        self.margin = float(columns['margin'][i])
+        self.numplayers = int(columns['numplayers'][i])
+        self.rank_in_game = int(columns['rank_in_game'][i])
+        self.map = int(columns['map'][i])
+        self.period = int(columns['period'][i])
+        self.options = {OPTIONS[j]: v for j, v in enumerate(columns['options'][i].tolist()) if v}
+        self.score_tiles = {str(r + 1): v for r, v in enumerate(columns['score_tiles'][i].tolist()) if v >= 0}
+        self.orders = {str(r): v for r, v in enumerate(columns['orders'][i].tolist()) if v}
+        self.builts = columns['builts'][i]
+        self.favs = columns['favs'][i]
+        self.bonus = tuple(v for v in columns['bonus'][i].tolist() if v >= 0)
+        self.leech_pw = columns['leech_pw'][i].tolist()
+        self.all_bons = columns['all_bons'][i]
+
+
+class Records(object):
+    """Parsed faction records stored as typed columns
+
+    Strings of unbounded length (users, games) are kept once in their own
+    tables and referenced by index, so every column is a plain NumPy array
+    that can be saved as .npy and memory-mapped back without unpickling.
+    Factions, maps and periods are small integer ids as well.
+
+    ratings holds the rating bucket of every user id; it depends on
+    ratings.json rather than on the games, so it is never saved and is
+    left to the caller to fill in.
+    """
+
+    def __init__(self, columns, users, games, ratings=None):
+        self.columns = columns
+        self.users = users
+        self.games = games
+        self.ratings = ratings
+
+    def __len__(self):
+        return len(self.columns['score'])
+
+    def __getitem__(self, i):
+        return Record(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Record(self, i)
+
+    def select(self, rows):
+        """Records of the given rows (an index or boolean array), sharing the tables."""
+        return Records({name: column[rows] for name, column in self.columns.items()}, self.users, self.games, self.ratings)
+
+    def save(self, path, key=None):
+        """Write every column as .npy into the directory path."""
+        tmp_path = path.with_name(path.name + '.tmp')
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+        for name, column in self.columns.items():
+            np.save(tmp_path / (name + '.npy'), column)
+        np.save(tmp_path / 'users.npy', self.users)
+        np.save(tmp_path / 'games.npy', self.games)
+        with open(tmp_path / 'key.json', 'w+') as f:
+            json.dump(key, f)
+        if path.exists():
+            shutil.rmtree(path)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path, key=None, mmap_mode='r'):
+        """Map the columns saved in path, None if it holds no records saved with key."""
+        try:
+            with open(path / 'key.json') as f:
+                if json.load(f) != key:
+                    return None
+        except FileNotFoundError:
+            return None
+        columns = {name: np.load(path / (name + '.npy'), mmap_mode=mmap_mode) for name in COLUMNS}
+        return cls(columns, np.load(path / 'users.npy'), np.load(path / 'games.npy'))
+
+
+class RecordBuffer(Records):
+    """Records being filled row by row
+
+    Columns are preallocated and grow by doubling; rows past the end are
+    kept cleared, so a new row only has to set the columns it knows about.
+    """
+
+    def __init__(self, capacity=1024):
+        super().__init__(empty_columns(capacity), [], [])
+        self.n = 0
+        self.user_ids = {}
+        self.game_ids = {}
+
+    def __len__(self):
+        return self.n
+
+    def append(self):
+        """Index of a new, cleared row."""
+        capacity = len(self.columns['score'])
+        if self.n == capacity:
+            columns = empty_columns(max(1, 2 * capacity))
+            for name, column in self.columns.items():
+                columns[name][:capacity] = column
+            self.columns = columns
+        self.n += 1
+        return self.n - 1
+
+    def truncate(self, n):
+        """Drop (and clear) the rows from n on."""
+        for name, column in self.columns.items():
+            column[n:self.n] = DEFAULTS.get(name, 0)
+        self.n = n
+
+    def user_id(self, user):
+        if user not in self.user_ids:
+            self.user_ids[user] = len(self.users)
+            self.users.append(user)
+        return self.user_ids[user]
+
+    def game_id(self, game):
+        if game not in self.game_ids:
+            self.game_ids[game] = len(self.games)
+            self.games.append(game)
+        return self.game_ids[game]
+
+    def records(self):
+        """Copy of the filled rows as Records."""
+        columns = {name: column[:self.n].copy() for name, column in self.columns.items()}
+        return Records(columns, np.array(self.users, dtype=str), np.array(self.games, dtype=str))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Timers and counters of a stats run, saved as a JSON report"""
+
+import json
+import resource
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+def peak_memory():
+    """Peak resident memory in bytes of this process and of its finished children."""
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in KiB on Linux
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+class RunReport(object):
+    """Wall/CPU time per stage, overall and per file, and run counters
+
+    Reports of worker processes are picklable and merged into the main one.
+
+    Usage:
+        with report.stage('parse', game_fn):
+            ...
+        report.count('games', file=game_fn)
+        report.skip('blacklist', game_fn)
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.stages = {}
+        self.files = {}
+        self.counts = Counter()
+        self.skipped = Counter()
+        self.outputs = {}
+
+    def file(self, game_fn):
+        name = str(game_fn)
+        if name not in self.files:
+            self.files[name] = {'stages': {}, 'counts': Counter(), 'skipped': Counter()}
+        return self.files[name]
+
+    def add(self, name, wall, cpu, file=None, calls=1):
+        """Add a measured run of stage name."""
+        stages = [self.stages] if file is None else [self.stages, self.file(file)['stages']]
+        for stage in stages:
+            s = stage.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            s['wall'] += wall
+            s['cpu'] += cpu
+            s['calls'] += calls
+
+    @contextmanager
+    def stage(self, name, file=None):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, file)
+
+    def count(self, name, n=1, file=None):
+        self.counts[name] += n
+        if file is not None:
+            self.file(file)['counts'][name] += n
+
+    def skip(self, reason, file=None, n=1):
+        self.skipped[reason] += n
+        if file is not None:
+            self.file(file)['skipped'][reason] += n
+
+    def output(self, filename, keys, size=None):
+        """Key cardinality (and byte size) of a written statpool."""
+        self.outputs[str(filename)] = {'keys': keys, 'bytes': size}
+
+    def merge(self, other):
+        """Add the timers and counters of another report (e.g. of a worker)."""
+        for name, s in other.stages.items():
+            self.add(name, s['wall'], s['cpu'], calls=s['calls'])
+        for name, f in other.files.items():
+            mine = self.file(name)
+            for stage, s in f['stages'].items():
+                t = mine['stages'].setdefault(stage, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+                for k in t:
+                    t[k] += s[k]
+            mine['counts'].update(f['counts'])
+            mine['skipped'].update(f['skipped'])
+        self.counts.update(other.counts)
+        self.skipped.update(other.skipped)
+        self.outputs.update(other.outputs)
+        return self
+
+    def as_dict(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start)),
+            'wall': time.time() - self.start,
+            'cpu': time.process_time(),
+            'cpu_children': sum(resource.getrusage(resource.RUSAGE_CHILDREN)[:2]),
+            'peak_memory': peak_memory(),
+            'stages': self.stages,
+            'counts': dict(self.counts),
+            'skipped': dict(self.skipped),
+            'outputs': self.outputs,
+            'files': {name: {'stages': f['stages'], 'counts': dict(f['counts']), 'skipped': dict(f['skipped'])}
+                      for name, f in self.files.items()},
+        }
+
+    def save(self, filename):
+        with open(filename, 'w+') as f:
+            json.dump(self.as_dict(), f, indent=2)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Statpools over a sliding window of periods
+
+Every period (the month of a game file) keeps its own partial statpool,
+with the period wildcarded out of its keys. The window pool slides by
+adding the incoming partial and subtracting the outgoing one with
+Welford.__sub__, so a slide costs one period of keys, not a window.
+"""
+
+import json
+from collections import deque
+
+
+def roll_key(key, mask):
+    return ''.join(c if m == '1' else '.' for c, m in zip(key, mask))
+
+
+def add_pool(statpool, other):
+    """Merge other, a statpool or its (key, stats) items, into statpool key by key."""
+    for key, stats in other.items() if isinstance(other, dict) else other:
+        if key in statpool:
+            statpool[key] = [a + b for a, b in zip(statpool[key], stats)]
+        else:
+            statpool[key] = stats
+    return statpool
+
+
+def roll_pool(statpool, mask):
+    """statpool merged over the positions wildcarded by mask."""
+    return add_pool({}, ((roll_key(key, mask), stats) for key, stats in statpool.items()))
+
+
+def subtract_pool(statpool, other):
+    """Take other, which was added to statpool before, back out of it."""
+    for key, stats in other.items():
+        left = [a - b for a, b in zip(statpool[key], stats)]
+        if left[0].n > 0:
+            statpool[key] = left
+        else:
+            del statpool[key]
+    return statpool
+
+
+class StatpoolDir(object):
+    """Mapping of period to statpool, one json file per period in path
+
+    save and load are the statpool writer and reader (stats.save_stats
+    and query.load_statpool), so partials are only read when needed.
+    """
+
+    def __init__(self, path, save, load):
+        self.path = path
+        self.save = save
+        self.load = load
+
+    def filename(self, period):
+        return self.path / (period + '.json')
+
+    def __contains__(self, period):
+        return self.filename(period).is_file()
+
+    def __getitem__(self, period):
+        return self.load(self.filename(period))
+
+    def __setitem__(self, period, statpool):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.save(statpool, self.filename(period))
+
+    def __delitem__(self, period):
+        self.filename(period).unlink()
+
+
+class RollingPool(object):
+    """Statpool of the last window periods
+
+    partials maps every period in the window to its statpool: a dict, or
+    a StatpoolDir to keep them on disk between runs. versions remembers
+    what each partial was computed from, e.g. a game file fingerprint.
+
+    Usage:
+        rolling = RollingPool(6)
+        for period, statpool in monthly_pools:
+            rolling.push(period, statpool)
+        rolling.pool  # the last 6 months
+    """
+
+    def __init__(self, window, pool=None, periods=(), partials=None, versions=None):
+        self.window = window
+        self.pool = {} if pool is None else pool
+        self.periods = deque(periods)
+        self.partials = {} if partials is None else partials
+        self.versions = {} if versions is None else versions
+
+    def push(self, period, partial, version=None):
+        """Slide the window to take in period; returns the periods that left it."""
+        add_pool(self.pool, partial)
+        self.periods.append(period)
+        self.partials[period] = partial
+        self.versions[period] = version
+        left = []
+        while len(self.periods) > self.window:
+            old = self.periods.popleft()
+            subtract_pool(self.pool, self.partials[old])
+            del self.partials[old]
+            del self.versions[old]
+            left.append(old)
+        return left
+
+    def replace(self, period, partial, version=None):
+        """Swap the partial of a period already in the window, e.g. a month still being played."""
+        subtract_pool(self.pool, self.partials[period])
+        add_pool(self.pool, partial)
+        self.partials[period] = partial
+        self.versions[period] = version
+
+    def state(self):
+        return {'window': self.window, 'periods': list(self.periods), 'versions': self.versions}
+
+    def save(self, path, save):
+        """Write the window pool and its periods into path (the partials are already there)."""
+        path.mkdir(parents=True, exist_ok=True)
+        save(self.pool, path / 'window.json')
+        with open(path / 'state.json', 'w+') as f:
+            json.dump(self.state(), f)
+
+    @classmethod
+    def load(cls, path, window, save, load):
+        """RollingPool saved in path, empty when there is none or its window differs."""
+        partials = StatpoolDir(path / 'periods', save, load)
+        try:
+            with open(path / 'state.json') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = None
+        if state is None or state['window'] != window:
+            for period in state['periods'] if state else ():
+                if period in partials:
+                    del partials[period]
+            return cls(window, partials=partials)
+        return cls(window, load(path / 'window.json'), state['periods'], partials, state['versions'])
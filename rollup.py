@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""Precomputed roll-ups of a statpool
+
+A roll-up merges the Welfords of every key that only differs in the
+positions its mask wildcards, like one cuboid of an OLAP cube. Queries
+which wildcard those positions anyway are then answered from the much
+smaller rolled pool, by a direct lookup when the rest of the pattern is
+literal.
+"""
+
+import time
+
+from query import ANY, END, STAR, KeyIndex, parse_pattern
+from rolling import roll_pool
+
+
+class Rollup(object):
+    """Statpool merged over the positions wildcarded by mask
+
+    '1' in the mask keeps a position, '.' wildcards it, positions past
+    the end of the mask are dropped (see stats.ROLLUPS).
+    """
+
+    def __init__(self, statpool, mask):
+        self.mask = mask
+        start = time.perf_counter()
+        self.pool = roll_pool(statpool, mask)
+        self.index = KeyIndex(self.pool)
+        self.build_time = time.perf_counter() - start
+
+    def covers(self, tokens):
+        """Whether the pattern tokens never look at a position the mask drops."""
+        for p, token in enumerate(tokens):
+            if token is STAR:
+                return p >= len(tokens) - 1
+            if token is END or p >= len(self.mask):
+                return False
+            if token is not ANY and self.mask[p] != '1':
+                return False
+        return True
+
+    def query(self, tokens):
+        """Merged stats of the tokens, which have to be covered."""
+        tokens = [token for token in tokens if token is not STAR]
+        if self.is_lookup(tokens):
+            return self.pool.get(''.join('.' if token is ANY else next(iter(token)) for token in tokens))
+        return self.index.query_tokens(tokens)
+
+    def is_lookup(self, tokens):
+        """Whether tokens name exactly one rolled key."""
+        if len(tokens) != len(self.mask):
+            return False
+        for token, m in zip(tokens, self.mask):
+            if m == '1' and (token is ANY or len(token) != 1):
+                return False
+        return True
+
+
+class Cube(object):
+    """KeyIndex over a statpool, with roll-ups answering the queries they cover"""
+
+    def __init__(self, statpool, rollups):
+        self.base = KeyIndex(statpool)
+        self.rollups = {name: Rollup(statpool, mask) for name, mask in rollups.items()}
+
+    def rollup_for(self, tokens):
+        """The smallest roll-up covering tokens, None if the base index is needed."""
+        covering = [rollup for rollup in self.rollups.values() if rollup.covers(tokens)]
+        return min(covering, key=lambda rollup: len(rollup.pool), default=None)
+
+    def query(self, pattern):
+        tokens = parse_pattern(pattern)
+        rollup = self.rollup_for(tokens)
+        if rollup is None:
+            return self.base.query_tokens(tokens)
+        return rollup.query(tokens)
+
+    def report(self, repeat=20):
+        """Size and speed of every roll-up against the base index.
+
+        The speed is that of a query wildcarding every dropped position,
+        which is what the roll-up saves the base index from merging.
+        """
+        rows = []
+        for name, rollup in self.rollups.items():
+            pattern = next(iter(rollup.pool), '')
+            tokens = parse_pattern(pattern)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                self.base.query_tokens(tokens)
+            base_query_time = (time.perf_counter() - start) / repeat
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                rollup.query(tokens)
+            query_time = (time.perf_counter() - start) / repeat
+
+            rows.append({
+                'name': name,
+                'mask': rollup.mask,
+                'keys': len(rollup.pool),
+                'ratio': len(rollup.pool) / max(1, len(self.base.keys)),
+                'build_time': rollup.build_time,
+                'base_query_time': base_query_time,
+                'query_time': query_time,
+            })
+        return rows
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""Persistent index of the games already counted, across game dumps"""
+
+import jsonio
+
+
+def update_id(last_update):
+    """'2017-03-15 12:00:00' as the comparable integer 20170315120000."""
+    return int(''.join(c for c in last_update if c.isdigit()) or 0)
+
+
+# format of games.seen.json, an older one is rebuilt from the game files
+SEEN_VERSION = 2
+
+
+class SeenGames(object):
+    """Owning dump of every game id
+
+    A game found in several dumps (a re-downloaded month, overlapping
+    dumps) is only counted from its owner: the dump with the latest
+    last_update, the first one by name on a tie, as a fresh run over the
+    dumps in order would pick. Every dump's whole set of games is kept,
+    so a dump which no longer holds a game gives it back to the other
+    dumps holding it. Lookups are dict hits, so checking a game stays
+    O(1) with millions indexed.
+
+    Usage:
+        seen = SeenGames.load(path)
+        changed = seen.claim(game_ids, last_updates, game_fn.name)
+        skip = seen.duplicates(game_fn.name)  # counted from the dumps owning them
+        seen.save(path)
+    """
+
+    def __init__(self, dumps=None):
+        # name of every dump: {game id: last_update id}
+        self.dumps = {} if dumps is None else dumps
+        # game id: (last_update id, name) of every dump holding it
+        self.games = {}
+        for name, games in self.dumps.items():
+            for game_id, last_update in games.items():
+                self.games.setdefault(game_id, []).append((last_update, name))
+        self.changed = False
+
+    def __len__(self):
+        return len(self.games)
+
+    def owner(self, game_id):
+        """Name of the dump owning game_id, None if no dump holds it."""
+        claims = self.games.get(game_id)
+        if not claims:
+            return None
+        return min(claims, key=lambda claim: (-claim[0], claim[1]))[1]
+
+    def claim(self, game_ids, last_updates, name):
+        """Make game_ids (with their last_updates) the whole set of games of dump name.
+
+        Games name held before and no longer does go back to the other
+        dumps holding them. Returns the names of the other dumps which
+        lost games to name or got games back from it.
+        """
+        new = dict(zip(game_ids, last_updates))
+        old = self.dumps.get(name, {})
+        touched = [game_id for game_id in old.keys() | new.keys() if old.get(game_id) != new.get(game_id)]
+        owners = {game_id: self.owner(game_id) for game_id in touched}
+        for game_id in touched:
+            claims = [claim for claim in self.games.get(game_id, ()) if claim[1] != name]
+            if game_id in new:
+                claims.append((new[game_id], name))
+            if claims:
+                self.games[game_id] = claims
+            else:
+                del self.games[game_id]
+        self.dumps[name] = new
+
+        changed = set()
+        for game_id, before in owners.items():
+            after = self.owner(game_id)
+            if after != before:
+                changed.update((before, after))
+        changed -= {name, None}
+        if touched:
+            self.changed = True
+        return changed
+
+    def duplicates(self, name):
+        """Game ids of dump name which another dump owns, sorted."""
+        return sorted(game_id for game_id in self.dumps.get(name, ()) if self.owner(game_id) != name)
+
+    def release(self, names):
+        """Forget the dumps not in names; returns the dumps which got games back from them."""
+        names = set(names)
+        changed = set()
+        for name in [name for name in self.dumps if name not in names]:
+            changed |= self.claim((), (), name)
+            del self.dumps[name]
+            self.changed = True
+        return changed & names
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(jsonio.dumps({'version': SEEN_VERSION, 'dumps': self.dumps}))
+        self.changed = False
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'rb') as f:
+                data = jsonio.loads(f.read())
+        except FileNotFoundError:
+            return cls()
+        if data.get('version') != SEEN_VERSION:
+            return cls()
+        return cls(data['dumps'])
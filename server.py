@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Local HTTP service answering statpool queries
+
+    GET /query?pattern=a0100000001.[hk]..&pattern=...
+
+returns, for every pattern, the merged n/mean/std of each stat (null when
+no key matches), the same numbers the web page computes after downloading
+the whole statpool. GET /stats reports the LRU result cache.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+from query import KeyIndex, load_statpool
+from rollup import Cube
+from shards import load_shards
+from stats import ROLLUPS
+
+STAT_NAMES = ('score', 'margin')
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class QueryService(object):
+    """Statpool loaded once, with an LRU cache of query results"""
+
+    def __init__(self, index, cache_size=4096):
+        self.index = index
+        self.query = lru_cache(maxsize=cache_size)(self._query)
+
+    def _query(self, pattern):
+        stats = self.index.query(pattern)
+        if stats is None:
+            return None
+        return {name: {'n': s.n, 'mean': s.mean, 'std': s.std} for name, s in zip(STAT_NAMES, stats)}
+
+    def handle(self, method, target):
+        """Status and JSON body for one request."""
+        if method != 'GET':
+            return 405, {'error': "only GET is supported"}
+        url = urlsplit(target)
+        if url.path == '/query':
+            patterns = parse_qs(url.query).get('pattern')
+            if not patterns:
+                return 400, {'error': "missing pattern"}
+            try:
+                return 200, {pattern: self.query(pattern) for pattern in patterns}
+            except ValueError as e:
+                return 400, {'error': str(e)}
+        if url.path == '/stats':
+            return 200, self.query.cache_info()._asdict()
+        return 404, {'error': "unknown path"}
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    status, body = 400, {'error': "malformed request"}
+                    version = 'HTTP/1.0'
+                else:
+                    status, body = self.handle(method, target)
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Access-Control-Allow-Origin: *\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.serve_client, host, port)
+    print(f"serving on http://{host}:{port}/query?pattern=...")
+    async with server:
+        await server.serve_forever()
+
+
+async def load_test(host, port, patterns, connections=8, requests=1000):
+    """Send requests GETs over keep-alive connections, print the throughput."""
+    targets = [f"/query?pattern={quote(pattern, safe='')}" for pattern in patterns]
+
+    async def client(n):
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in range(n):
+            writer.write(f"GET {targets[i % len(targets)]} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(requests // connections) for _ in range(connections)])
+    elapsed = time.perf_counter() - start
+    done = requests // connections * connections
+    print(f"{done} requests in {elapsed:.2f}s, {done / elapsed:.0f} requests/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('statpool', type=Path, nargs='?', help="stats json (docs/stats.json) or shard directory (docs/stats-shards)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cache-size', type=int, default=4096, help="query results kept in the LRU cache")
+    parser.add_argument('--rollups', action='store_true', help="precompute the roll-ups of stats.ROLLUPS")
+    parser.add_argument('--load-test', nargs='+', metavar='PATTERN',
+                        help="instead of serving, load test a running server with these patterns")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--connections', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.load_test:
+        asyncio.run(load_test(args.host, args.port, args.load_test, args.connections, args.requests))
+    elif args.statpool is None:
+        parser.error("the statpool to serve is required")
+    else:
+        if args.statpool.is_dir():
+            statpool = load_shards(args.statpool)
+        else:
+            statpool = load_statpool(args.statpool)
+        index = Cube(statpool, ROLLUPS) if args.rollups else KeyIndex(statpool)
+        try:
+            asyncio.run(serve(QueryService(index, args.cache_size), args.host, args.port))
+        except KeyboardInterrupt:
+            pass
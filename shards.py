@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""Sharded, binary statpool files for the web pages
+
+Every shard holds the keys sharing the characters at the shard
+positions (map and faction in stats.py) and is laid out as
+
+    magic   b'TMS1'
+    uint32  number of keys
+    uint32  number of stats per key
+    uint32  byte length of the key table
+    keys    '\\n' separated, padded with '\\0' to a multiple of 8 bytes
+    float64 for every stat, n of every key, then M1, M2, M3 and M4 of
+            every key
+
+all little-endian, so a page only downloads the shard it asks about and
+reads the moments straight into a Float64Array. Keeping each moment in
+its own run (most keys have n=1 and M2-M4 of 0) helps HTTP compression.
+Quantile digests, when the statpool has them, follow the moments in
+the format of digest.py.
+"""
+
+import json
+import shutil
+import struct
+
+import numpy as np
+
+from digest import decode_digests, encode_digests
+from welford import Welford
+
+MAGIC = b'TMS1'
+HEADER = struct.Struct('<4sIII')
+
+
+def shard_name(key, positions):
+    return ''.join(key[p] for p in positions)
+
+
+def encode_shard(statpool):
+    """Bytes of statpool; the quantile digests after the moments, if it has any."""
+    keys = '\n'.join(statpool).encode()
+    keys += b'\0' * (-len(keys) % 8)
+    first = next(iter(statpool.values()), [])
+    nstats = sum(isinstance(s, Welford) for s in first)
+    moments = np.array(
+        [[(s.n, s.M1, s.M2, s.M3, s.M4) for s in stats[:nstats]] for stats in statpool.values()],
+        dtype='<f8').reshape(len(statpool), nstats, 5)
+    data = HEADER.pack(MAGIC, len(statpool), nstats, len(keys)) + keys + moments.transpose(1, 2, 0).tobytes()
+    if len(first) > nstats:
+        data += encode_digests([stats[nstats:] for stats in statpool.values()])
+    return data
+
+
+def decode_shard(data):
+    magic, nkeys, nstats, keys_len = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a stats shard")
+    keys = data[HEADER.size:HEADER.size + keys_len].rstrip(b'\0').decode().split('\n') if nkeys else []
+    end = HEADER.size + keys_len + nkeys * nstats * 5 * 8
+    moments = np.frombuffer(data, '<f8', nkeys * nstats * 5, HEADER.size + keys_len)
+    moments = moments.reshape(nstats, 5, nkeys).transpose(2, 0, 1).tolist()
+    statpool = {key: [Welford.from_moments(*m) for m in stats] for key, stats in zip(keys, moments)}
+    if len(data) > end:
+        for stats, digests in zip(statpool.values(), decode_digests(data, nkeys, end)):
+            stats.extend(digests)
+    return statpool
+
+
+def save_shards(statpool, path, positions):
+    """Write statpool as one binary file per shard of the key positions into the directory path.
+
+    index.json lists the shards with their key count and size, and the
+    key positions they are split on.
+    """
+    shards = {}
+    for key, stats in statpool.items():
+        shards.setdefault(shard_name(key, positions), {})[key] = stats
+
+    if path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    index = {'positions': list(positions), 'shards': {}}
+    for name, shard in shards.items():
+        data = encode_shard(shard)
+        with open(path / (name + '.bin'), 'wb') as f:
+            f.write(data)
+        index['shards'][name] = {'keys': len(shard), 'bytes': len(data)}
+    with open(path / 'index.json', 'w+') as f:
+        json.dump(index, f, indent=2)
+
+
+def load_shards(path, names=None):
+    """Read back the statpool of the named shards (all by default)."""
+    if names is None:
+        with open(path / 'index.json') as f:
+            names = json.load(f)['shards']
+    statpool = {}
+    for name in names:
+        with open(path / (name + '.bin'), 'rb') as f:
+            statpool.update(decode_shard(f.read()))
+    return statpool
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Statpool aggregation within a memory budget
+
+A SpillPool merges statpools like rolling.add_pool, but once it holds
+more keys than its budget allows it writes them out, sorted, as a run
+file and starts over. items() merges the runs and what is left in
+memory back together, key by key with Welford.__add__, so the whole
+pool is never held at once. A run is
+
+    uint32  number of stats per key
+    uint32  number of quantile digests per key
+    then for every key, in key order:
+    uint16  byte length of the key
+    key     utf-8
+    float64 n, M1, M2, M3 and M4 of every stat
+    uint32  byte length of its digests, and the digests (digest.py),
+            if there are any
+
+all little-endian.
+"""
+
+import heapq
+import shutil
+import struct
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+from digest import decode_digests, encode_digests
+from rolling import add_pool
+from welford import Welford
+
+# rough size of a statpool entry: the key, its list and two Welfords
+KEY_BYTES = 512
+
+RUN_HEADER = struct.Struct('<II')
+KEY_LENGTH = struct.Struct('<H')
+DIGEST_LENGTH = struct.Struct('<I')
+
+
+def write_run(path, items):
+    """Write (key, stats) items, sorted by key, as a run file."""
+    with open(path, 'wb') as f:
+        nstats = None
+        for key, stats in items:
+            if nstats is None:
+                nstats = sum(isinstance(s, Welford) for s in stats)
+                f.write(RUN_HEADER.pack(nstats, len(stats) - nstats))
+            key = key.encode()
+            f.write(KEY_LENGTH.pack(len(key)))
+            f.write(key)
+            f.write(np.array([(s.n, s.M1, s.M2, s.M3, s.M4) for s in stats[:nstats]], dtype='<f8').tobytes())
+            if len(stats) > nstats:
+                digests = encode_digests([stats[nstats:]])
+                f.write(DIGEST_LENGTH.pack(len(digests)))
+                f.write(digests)
+
+
+def read_run(path):
+    """The (key, stats) items of a run file, read as they are needed."""
+    with open(path, 'rb') as f:
+        header = f.read(RUN_HEADER.size)
+        if not header:
+            return
+        nstats, ndigests = RUN_HEADER.unpack(header)
+        size = nstats * 5 * 8
+        while True:
+            length = f.read(KEY_LENGTH.size)
+            if not length:
+                return
+            key = f.read(KEY_LENGTH.unpack(length)[0]).decode()
+            moments = np.frombuffer(f.read(size), '<f8').reshape(nstats, 5).tolist()
+            stats = [Welford.from_moments(*m) for m in moments]
+            if ndigests:
+                length, = DIGEST_LENGTH.unpack(f.read(DIGEST_LENGTH.size))
+                stats += decode_digests(f.read(length), 1)[0]
+            yield key, stats
+
+
+class SpillPool(object):
+    """Statpool which spills sorted runs into path over budget bytes
+
+    Usage:
+        pool = SpillPool(256 << 20, path)
+        for statpool in partials:
+            pool.add(statpool)
+        for key, stats in pool.items():  # in key order
+            ...
+        pool.clear()
+    """
+
+    def __init__(self, budget, path):
+        self.max_keys = max(1, budget // KEY_BYTES)
+        self.path = path
+        self.pool = {}
+        self.runs = []
+
+    def add(self, statpool):
+        add_pool(self.pool, statpool)
+        if len(self.pool) > self.max_keys:
+            self.spill()
+        return self
+
+    def spill(self):
+        """Write the keys in memory out as a run."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        run = self.path / f'run{len(self.runs):05d}.bin'
+        write_run(run, sorted(self.pool.items(), key=itemgetter(0)))
+        self.runs.append(run)
+        self.pool = {}
+
+    def items(self):
+        """(key, stats) of the merged pool, in key order."""
+        sources = [read_run(run) for run in self.runs]
+        sources.append(sorted(self.pool.items(), key=itemgetter(0)))
+        for key, group in groupby(heapq.merge(*sources, key=itemgetter(0)), key=itemgetter(0)):
+            stats = None
+            for _, other in group:
+                stats = other if stats is None else [a + b for a, b in zip(stats, other)]
+            yield key, stats
+
+    def clear(self):
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.pool = {}
+        self.runs = []
@@ -3,20 +3,84 @@
 
 """Terra Mystica Online stats summarizer"""
 
-import copy
-import gzip
-import json
-import pickle
-from collections import defaultdict
+import argparse
+import bisect
+import hashlib
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from pathlib import Path
 
+import uptodate
+
+
+def add_verbosity_arguments(parser):
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help="also print every skipped game and faction")
+    parser.add_argument('-q', '--quiet', action='count', default=0,
+                        help="only print warnings")
+
+
+if __name__ == '__main__':
+    # an unchanged run is found out before the heavy imports below
+    inputs = uptodate.fingerprint(sys.argv[1:])
+    if uptodate.is_current(inputs):
+        verbosity_parser = argparse.ArgumentParser(add_help=False)
+        add_verbosity_arguments(verbosity_parser)
+        flags, _ = verbosity_parser.parse_known_args()
+        if flags.verbose - flags.quiet >= 0:
+            print("Nothing changed since the last run, see", uptodate.MANIFEST_PATH.name)
+        sys.exit(0)
+
 import numpy as np
 
-from welford import Welford
+import jsonio
+from digest import group_digests
+from gameio import game_name, game_suffix, read_games
+from keyschema import Code, Digits, KeySchema, Set, Stat
+from partitions import PartitionStore
+from players import PlayerPool
+from query import load_statpool
+from records import OPTIONS, RecordBuffer, Records
+from report import RunReport
+from rolling import RollingPool, roll_pool
+from rollup import Cube
+from seen import SeenGames, update_id
+from shards import save_shards
+from spill import SpillPool
+from welford import Welford, group_moments
 
 PACKAGE_DIR = Path(__file__).parent
 GAME_PATH = PACKAGE_DIR / 'games'
-GAME_FILENAME = PACKAGE_DIR / 'games.pickle.gz'
+CACHE_PATH = PACKAGE_DIR / 'games.cache'
+ROLLING_PATH = PACKAGE_DIR / 'games.rolling'
+PARTITION_PATH = PACKAGE_DIR / 'games.partitions'
+SEEN_PATH = PACKAGE_DIR / 'games.seen.json'
+SPILL_PATH = PACKAGE_DIR / 'games.spill'
+CACHE_VERSION = 6
+# format of the partitions, per-player partials since 2
+PARTITION_VERSION = 2
+# scores at which the rating buckets 2, 3, 4, ... start; 1 is below, 0 unrated
+RATING_THRESHOLDS = (1000, 1100, 1250)
+
+# 0: warnings only, 1: progress, 2: every skipped game and faction
+verbosity = 1
+# stats json without indentation
+compact = False
+# also keep a quantile Digest of every statfunc per key
+quantiles = False
+report = RunReport()
+# SeenGames owning every game across the game files, None to count duplicates
+seen = None
+# whether seen is used, all the workers need to know of it
+dedup = False
+# fingerprint of ratings.json, what the rating buckets are computed from
+ratings_version = None
+rating_thresholds = RATING_THRESHOLDS
+# whether this process is a worker of a process pool
+_worker = False
 
 MAPDICT = {
     '126fe960806d587c78546b30f1a90853b1ada468': 'a',  # Original
@@ -108,276 +172,563 @@ FDICT = {
     'yetis': 't'
 }
 
+# records keep factions and maps as ids, turned into key characters by index
+FACTIONS = tuple(FDICT)
+FACTION_IDS = {name: i for i, name in enumerate(FACTIONS)}
+FACTION_CHARS = tuple(FDICT.values())
+MAP_IDS = {base_map: i for i, base_map in enumerate(MAPDICT)}
+MAP_CHARS = tuple(MAPDICT.values())
+# period id: two digit year * 16 + month, key characters yy + hex month
+PERIOD_CHARS = tuple(f'{year:02d}{month:x}' for year in range(100) for month in range(16))
+
+
+ROUNDS = {str(r): r for r in range(7)}
+
+BUILDINGS = ('build:D', 'upgrade:TP', 'upgrade:TE', 'upgrade:SA', 'upgrade:SH')
+
+# faction events used by extract_faction, event: (kind, index)
+EVENTS = {'vp': ('vp', 0), 'leech:pw': ('leech', 0)}
+EVENTS.update((event, ('build', i)) for i, event in enumerate(BUILDINGS))
+EVENTS.update((f'favor:FAV{i + 1}', ('favor', i)) for i in range(12))
+EVENTS.update((f'pass:BON{i + 1}', ('bonus', i)) for i in range(10))
+EVENTS.update((f'order:{num}', ('order', num)) for num in range(1, 8))
+
+
+def extract_faction(records, i, events):
+    """Fill row i of records from the events of one faction.
+
+    The events are walked once, anything not in EVENTS is skipped.
+    Returns the number of rounds with a passed BON (0 for an empty seat).
+    """
+    built = [[0] * 7 for building in BUILDINGS]
+    favs = [9] * 12
+    orders = [0] * 7
+    leech_pw = [0] * 7
+    bonus = []
+    score = None
+    for event, value in events.items():
+        kind = EVENTS.get(event)
+        if kind is None:
+            continue
+        kind, index = kind
+        rounds = value['round']
+        if kind == 'vp':
+            score = rounds['all'] + 20
+        elif kind == 'build':
+            for r, count in rounds.items():
+                if r in ROUNDS:
+                    built[index][ROUNDS[r]] = count
+        elif kind == 'favor':
+            # which round it was taken
+            for r in rounds:
+                if r != 'all':
+                    favs[index] = int(r)
+                    break
+        elif kind == 'bonus':
+            for r, count in rounds.items():
+                if r in ROUNDS and count == 1:
+                    bonus.append((ROUNDS[r], index))
+        elif kind == 'order':
+            for r in rounds:
+                if r in ROUNDS:
+                    orders[ROUNDS[r]] = max(orders[ROUNDS[r]], index)
+        else:
+            for r, count in rounds.items():
+                if r in ROUNDS:
+                    leech_pw[ROUNDS[r]] = min(4, int(count / 4))
+    if score is None:
+        raise KeyError('vp')
+
+    # upgrade path...
+    D_evt, TP_evt, TE_evt, SA_evt, SH_evt = np.array(built)
+    builts = (D_evt - TP_evt, TP_evt - TE_evt - SH_evt, TE_evt - SA_evt, SA_evt, SH_evt)
+
+    # each round, which BON
+    bonus = [index for r, index in sorted(bonus)][:7]
+
+    c = records.columns
+    c['score'][i] = score
+    c['builts'][i] = np.cumsum(builts, axis=1)
+    c['favs'][i] = favs
+    c['orders'][i] = orders
+    c['leech_pw'][i] = leech_pw
+    c['bonus'][i, :len(bonus)] = bonus
+    return len(bonus)
+
+
+def extract_game(game):
+    """Values of a game shared by the records of all its factions."""
+    global_ = game['events']['global']
+    options = {}
+    score_tiles = {}
+    parse_global(global_, options, score_tiles)
+    multifaction = parse_players(game['factions'], options)
+
+    all_events = game['events']['faction']['all']
+    all_bons = [0] * 11
+    for i in range(10):
+        event = all_events.get(f'pass:BON{i + 1}')
+        if event is not None:
+            all_bons[i + 1] = max([0] + [count for r, count in event['round'].items() if r in ROUNDS])
+
+    numplayers = game['player_count']
+    return {
+        'numplayers': numplayers,
+        'avgscore': float(all_events['vp']['round']['all']) / numplayers + 20,
+        'map': MAP_IDS[game['base_map']],
+        'period': period_id(game['last_update']),
+        'last_update': update_id(game['last_update']),
+        'options': [int(options.get(opt, 0)) for opt in OPTIONS],
+        'score_tiles': [score_tiles.get(str(r), -1) for r in range(1, 7)],
+        'all_bons': all_bons,
+        'multifaction': multifaction,
+        'num_nofactions': numplayers - global_['faction-count']['round']['all'],
+    }
+
+
+def period_id(last_update):
+    return int(last_update[2:4]) * 16 + int(last_update[5:7])
+
+
+def parse_global(global_, options, score_tiles):
+    for k, v in global_.items():
+        if 'option-fire-and-ice-final-scoring' in k:
+            continue
 
-class FactionStat(object):
-    """faction status in game result"""
-
-    def __init__(self, game, name):
-        self.game_id = game['game']
-        self.name = name
-        self.globals = game['events']['global']
-        fac_events = game['events']['faction'][name]
-        self.user = game['factions2'][name]
-        self.score = fac_events['vp']['round']['all'] + 20
-        self.numplayers = game['player_count']
-        avgscore = float(game['events']['faction']['all']['vp']['round']['all']) / self.numplayers + 20
-        self.margin = self.score - avgscore
-        self.map_type = MAPDICT[game['base_map']]
-        self.all_bons = self.parse_picked_bonus(game['events']['faction']['all'])
-
-        self.parse_events(fac_events)
-        self.orders = self.parse_order(fac_events)
-        self.options = {}
-        self.score_tiles = {}
-        self.parse_global(game['events']['global'])
-        self.parse_players(game['factions'])
-        self.num_nofactions = game['player_count'] - game['events']['global']['faction-count']['round']['all']
-        self.rank_in_game = 1
-        self.period = game['last_update'][2:4] + hex(int(game['last_update'][5:7]))[2]
-
-    def parse_event(self, events, event_id):
-        if event_id not in events:
-            return np.zeros(7)
-        r = defaultdict(int, events[event_id]['round'])
-        return np.array((r['0'], r['1'], r['2'], r['3'], r['4'], r['5'], r['6']))
-
-    def parse_favor(self, events, num):
-        key = f'favor:FAV{num}'
-        if key not in events:
-            return 9
-        r = list(events[key]['round'].keys())
-        r.remove('all')
-        return int(r[0])
-
-    def parse_favors(self, events):
-        return np.array([self.parse_favor(events, i) for i in range(1, 13)])
-
-    def parse_town(self, events, num):
-        key = 'town:TW' + str(num)
-        if key not in events:
-            return 0
-        r = list(events[key]['round'].keys())
-        r.remove('all')
-        return int(r[0])
-
-    def parse_towns(self, events):
-        np.array([self.parse_town(events, i) for i in range(1, 9)])
-
-    def parse_bonus(self, events):
-        return tuple(np.where(np.array([self.parse_event(events, 'pass:BON' + str(i)) for i in range(1, 11)]).transpose() == 1)[1])
-
-    def parse_picked_bonus(self, events):
-        data = np.zeros(11)
-        for i in range(1, 11):
-            data[i] = max(self.parse_event(events, 'pass:BON' + str(i)))
-        return data
-
-    def parse_allbonus(self, events, num):
-        key = 'pass:BON' + str(num)
-        if key not in events:
-            return np.zeros(7)
-        r = defaultdict(int, events[key]['round'])
-        return np.array((r['0'], r['1'], r['2'], r['3'], r['4'], r['5'], r['6']))
-
-    def parse_order(self, events):
-        result = {}
-        for num in range(1, 8):
-            key = 'order:' + str(num)
-            if key not in events:
-                continue
-            r = list(events[key]['round'].keys())
-            r.remove('all')
-            for k in r:
-                result[str(k)] = num
-        return result
-
-    def parse_leech(self, events):
-        pw = []
-        for k in self.parse_event(events, 'leech:pw'):
-            pw.append(min(4, int(k / 4)))
-        return pw
-
-    def parse_events(self, events):
-        D_evt = self.parse_event(events, 'build:D')
-        TP_evt = self.parse_event(events, 'upgrade:TP')
-        TE_evt = self.parse_event(events, 'upgrade:TE')
-        SA_evt = self.parse_event(events, 'upgrade:SA')
-        SH_evt = self.parse_event(events, 'upgrade:SH')
-
-        # upgrade path...
-        D = np.cumsum(D_evt - TP_evt)
-        TP = np.cumsum(TP_evt - TE_evt - SH_evt)
-        TE = np.cumsum(TE_evt - SA_evt)
-        SA = np.cumsum(SA_evt)
-        SH = np.cumsum(SH_evt)
-
-        # each building, each round
-        self.builts = np.array((D, TP, TE, SA, SH), dtype=int)
-
-        # each FAV, which round (if any)
-        self.favs = self.parse_favors(events)
-
-        # each TW, which round (if any)
-        self.towns = self.parse_towns(events)
-
-        # each round, which BON
-        self.bonus = self.parse_bonus(events)
-
-        self.leech_pw = self.parse_leech(events)
-
-    def parse_global(self, global_):
-        for k, v in global_.items():
-            if 'option-fire-and-ice-final-scoring' in k:
-                continue
-
-            if 'option-' in k:
-                opt_key = k.replace('option-', '')
-                if opt_key.startswith('fire-and-ice-factions/variable_v'):
-                    self.options['fire-and-ice-factions/variable'] = opt_key.replace('fire-and-ice-factions/variable_v', '')
-                else:
-                    self.options[opt_key] = '1'
-
-            if 'SCORE' in k:
-                sid = int(k.replace('SCORE', ''))
-                for r in range(1, 7):
-                    if str(r) in v['round']:
-                        self.score_tiles[str(r)] = sid
-
-            # Greatest Distance
-            if 'scoring-connected-distance' in k:
-                self.options['fire-and-ice-final-scoring'] = 1
-
-            # Stronghold and Sanctuary
-            if 'scoring-connected-sa-sh-distance' in k:
-                self.options['fire-and-ice-final-scoring'] = 2
-
-            # Outposts
-            if 'scoring-building-on-edge' in k:
-                self.options['fire-and-ice-final-scoring'] = 3
-
-            # Settlements
-            if 'scoring-connected-clusters' in k:
-                self.options['fire-and-ice-final-scoring'] = 4
-        self.dropped_players = global_['drop-faction']['all'] if 'drop-faction' in global_ and 'all' in global_['drop-faction'] else 0
-
-    def parse_players(self, factions):
-        players = []
-        for faction in factions:
-            if faction['player'] is None:
-                players.append('anon-' + faction['faction'])
+        if 'option-' in k:
+            opt_key = k.replace('option-', '')
+            if opt_key.startswith('fire-and-ice-factions/variable_v'):
+                options['fire-and-ice-factions/variable'] = opt_key.replace('fire-and-ice-factions/variable_v', '')
             else:
-                players.append(faction['player'])
+                options[opt_key] = '1'
+
+        if 'SCORE' in k:
+            sid = int(k.replace('SCORE', ''))
+            for r in range(1, 7):
+                if str(r) in v['round']:
+                    score_tiles[str(r)] = sid
+
+        # Greatest Distance
+        if 'scoring-connected-distance' in k:
+            options['fire-and-ice-final-scoring'] = 1
+
+        # Stronghold and Sanctuary
+        if 'scoring-connected-sa-sh-distance' in k:
+            options['fire-and-ice-final-scoring'] = 2
 
-            if faction['faction'] == 'yetis' or faction['faction'] == 'icemaidens':
-                if 'fire-and-ice-factions/ice' not in self.options:
-                    self.options['fire-and-ice-factions/ice'] = 1
+        # Outposts
+        if 'scoring-building-on-edge' in k:
+            options['fire-and-ice-final-scoring'] = 3
+
+        # Settlements
+        if 'scoring-connected-clusters' in k:
+            options['fire-and-ice-final-scoring'] = 4
+
+
+def parse_players(factions, options):
+    players = []
+    for faction in factions:
+        if faction['player'] is None:
+            players.append('anon-' + faction['faction'])
+        else:
+            players.append(faction['player'])
 
-            if faction['faction'] == 'dragonlords' or faction['faction'] == 'acolytes':
-                if 'fire-and-ice-factions/volcano' not in self.options:
-                    self.options['fire-and-ice-factions/volcano'] = 1
+        if faction['faction'] == 'yetis' or faction['faction'] == 'icemaidens':
+            if 'fire-and-ice-factions/ice' not in options:
+                options['fire-and-ice-factions/ice'] = 1
 
-            if faction['faction'] == 'shapeshifters' or faction['faction'] == 'riverwalkers':
-                if 'fire-and-ice-factions/variable' not in self.options:
-                    self.options['fire-and-ice-factions/variable'] = 1
+        if faction['faction'] == 'dragonlords' or faction['faction'] == 'acolytes':
+            if 'fire-and-ice-factions/volcano' not in options:
+                options['fire-and-ice-factions/volcano'] = 1
 
-        self.multifaction = 1 if len(list(set(players))) != len(players) else 0
+        if faction['faction'] == 'shapeshifters' or faction['faction'] == 'riverwalkers':
+            if 'fire-and-ice-factions/variable' not in options:
+                options['fire-and-ice-factions/variable'] = 1
 
+    return 1 if len(list(set(players))) != len(players) else 0
 
-def load():
-    """Try to load from pickled data."""
-    allstats = []
-    if GAME_FILENAME.is_file():
-        with gzip.open(GAME_FILENAME) as game_file:
-            print("loading... ")
-            allstats = pickle.load(game_file)
-            print("done!")
-    return allstats
 
+def log(level, *args):
+    if verbosity >= level:
+        print(*args)
+
+
+def cache_key(game_fn):
+    """Fingerprint of a game file, its cached records are valid while it matches."""
+    st = game_fn.stat()
+    return [CACHE_VERSION, game_fn.name, st.st_size, st.st_mtime_ns]
+
+
+def load(game_fn, count=True):
+    """Try to map the records of a game file from its columnar cache."""
+    with report.stage('load_cache', game_fn):
+        records = Records.load(CACHE_PATH / game_fn.name, cache_key(game_fn))
+    if records is not None:
+        log(1, "loading", CACHE_PATH / game_fn.name, "...")
+        if count:
+            report.count('cached_files')
+    return records
+
+
+def save(game_fn, records):
+    with report.stage('save_cache', game_fn):
+        records.save(CACHE_PATH / game_fn.name, cache_key(game_fn))
+
+
+def parse_game(game, game_fn, records):
+    """Filter one decoded game and append the records of its factions."""
+    report.count('games', file=game_fn)
+    # duplicates across game files are left out by drop_games, the cache does not depend on them
+    if game['game'] in records.game_ids:
+        log(2, "Skipping duplicate game:", game['game'])
+        report.skip('duplicate', game_fn)
+        return
+
+    f = dict([(i['faction'], i['player']) for i in game['factions']])
+    if 'player1' in f or 'player2' in f or 'player3' in f or 'player4' in f or 'player5' in f or 'player6' in f or 'player7' in f:
+        log(2, "Skipping game with incomplete players:", game['game'])
+        report.skip('incomplete_players', game_fn)
+        return
+
+    if game['game'] in BLACKLIST:
+        log(2, "Skipping irregular game:", game['game'])
+        report.skip('blacklist', game_fn)
+        return
+
+    if 'drop-faction' in game['events']['global']:
+        log(2, "Skipping the game has dropped players:", game['game'])
+        report.skip('dropped_players', game_fn)
+        return
+
+    try:
+        shared = extract_game(game)
+    except KeyError as e:
+        log(2, game_fn, "failed! (", game['game'], "didn't have", str(e.args), ")")
+        report.skip('game_key_error', game_fn)
+        return
+
+    start = len(records)
+    for faction in f.keys():
+        if faction[:6] == 'nofact':
+            continue
+        i = records.append()
+        try:
+            records.columns['faction'][i] = FACTION_IDS[faction]
+            if not extract_faction(records, i, game['events']['faction'][faction]):  # Empty player count?
+                records.truncate(i)
+                report.skip('empty_faction', game_fn)
+                continue
+        except KeyError as e:
+            log(2, game_fn, "failed! (", faction, "didn't have", str(e.args), ")")
+            report.skip('faction_key_error', game_fn)
+            records.truncate(i)
+            continue
+
+        c = records.columns
+        c['margin'][i] = c['score'][i] - shared['avgscore']
+        for name in ('numplayers', 'map', 'period', 'last_update', 'options', 'score_tiles', 'all_bons'):
+            c[name][i] = shared[name]
+    end = len(records)
+    if end == start:
+        return
+
+    if shared['multifaction'] > 0:
+        log(2, "Player of this game plays multi factions:", game['game'])
+        report.skip('multifaction', game_fn)
+        records.truncate(start)
+        return
+    elif shared['num_nofactions'] > 0:
+        log(2, "Game with NoFaction:", game['game'])
+        report.skip('nofaction', game_fn)
+        records.truncate(start)
+        return
+
+    c = records.columns
+    scores = c['score'][start:end]
+    c['rank_in_game'][start:end] = 1 + (scores[:, None] < scores).sum(axis=1)
+    c['game'][start:end] = records.game_id(game['game'])
+    for i in range(start, end):
+        c['user'][i] = records.user_id(f[FACTIONS[c['faction'][i]]] or '')
+    report.count('games_parsed', file=game_fn)
+    report.count('factions', end - start, file=game_fn)
 
-def save(allstats):
-    print("saving... ")
-    with gzip.open(GAME_FILENAME, 'w+') as game_file:
-        pickle.dump(allstats, game_file)
-    print("done!")
+    if debug:
+        for i in range(start, end):
+            s = records[i]
+            s.rating = get_rating(records.users[s.user], None)
+            print(game['game'] + ',' + FACTIONS[s.faction] + ',' + get_key(s) + ',' + str(s.score) + ',' + str(s.margin) + ',' + str(s.score_tiles['1']) + ',' + str(s.score_tiles['2']) + ',' + str(s.score_tiles['3']) + ',' + str(s.score_tiles['4']) + ',' + str(s.score_tiles['5']) + ',' + str(s.score_tiles['6']))
 
 
 def parse_game_file(game_fn):
     if debug:
         print("game_id,faction,result_key,vp,margin,R1,R2,R3,R4,R5,R6")
 
-    stats = []
-    if game_fn.suffix == 'gz':
-        openfunc = gzip.open
-    else:
-        openfunc = open
-    with openfunc(game_fn) as game_file:
-        print("parsing ", game_fn, "...")
-        games = json.load(game_file)
-        for game in games:
-            f = dict([(i['faction'], i['player']) for i in game['factions']])
-            if 'player1' in f or 'player2' in f or 'player3' in f or 'player4' in f or 'player5' in f or 'player6' in f or 'player7' in f:
-                print("Skipping game with incomplete players:", game['game'])
-                continue
-            game['factions2'] = f
+    records = RecordBuffer()
+    with report.stage('parse', game_fn):
+        log(1, "parsing ", game_fn, "...")
+        for game in read_games(game_fn):
+            with report.stage('extract', game_fn):
+                parse_game(game, game_fn, records)
+    return records.records()
 
-            if game['game'] in BLACKLIST:
-                print("Skipping irregular game:", game['game'])
-                continue
 
-            if 'drop-faction' in game['events']['global']:
-                print("Skipping the game has dropped players:", game['game'])
-                continue
+def month_stats_path(game_fn):
+    """docs/stats1703.json for the game files of 2017-03."""
+    fn = game_name(game_fn)
+    return Path('docs/stats' + fn[2:4] + fn[5:7] + '.json')
 
-            factions = []
-            for faction in f.keys():
-                if faction[:6] == 'nofact':
-                    continue
-                try:
-                    s = FactionStat(game, faction)
-                    if s.bonus:  # Empty player count?
-                        if s.multifaction > 0:
-                            print("Player of this game plays multi factions:", s.game_id)
-                            break
-                        elif s.num_nofactions > 0:
-                            print("Game with NoFaction:", s.game_id)
-                            break
-                        else:
-                            factions.append(s)
-                except KeyError as e:
-                    print(game_fn, "failed! (", faction, "didn't have", str(e.args), ")")
-
-            for faction1 in factions:
-                for faction2 in factions:
-                    if faction1.score < faction2.score:
-                        faction1.rank_in_game += 1
-
-            if debug:
-                for s in factions:
-                    print(game['game'] + ',' + s.name + ',' + get_key(s) + ',' + str(s.score) + ',' + str(s.margin) + ',' + str(s.score_tiles['1']) + ',' + str(s.score_tiles['2']) + ',' + str(s.score_tiles['3']) + ',' + str(s.score_tiles['4']) + ',' + str(s.score_tiles['5']) + ',' + str(s.score_tiles['6']))
-
-            stats += factions
-
-    fn = game_fn.stem
-    stats_fn = 'docs/stats' + fn[2:4] + fn[5:7] + '.json'
-    stats_fn = Path(stats_fn)
+
+def save_month_stats(game_fn, stats, statpool=None):
+    """Write the monthly stats of a game file, unless they exist already.
+
+    statpool is compute_stats(stats, get_key) when the caller has it.
+    """
+    stats_fn = month_stats_path(game_fn)
     if not stats_fn.is_file():
-        save_stats(compute_stats(stats, get_key), stats_fn)
+        with report.stage('month_stats', game_fn):
+            if statpool is None:
+                statpool = compute_stats(stats, get_key)
+            save_stats(statpool, stats_fn)
+
+
+def load_game_file(game_fn, use_cache=True, count=True):
+    """Records of a game file, only parsed when its cache is missing or stale.
+
+    count is False for a file loaded again in the same run, so the report
+    counts every file and its records once.
+    """
+    stats = load(game_fn, count) if use_cache else None
+    if stats is None:
+        stats = parse_game_file(game_fn)
+        if use_cache:
+            save(game_fn, stats)
+    if count:
+        report.count('files')
+        report.count('records', len(stats), file=game_fn)
+    stats.ratings = get_ratings(stats.users)
     return stats
 
 
-def parse_games(game_list=None):
-    allstats = []
+def game_files(game_list=None):
+    """The game dumps of game_list (GAME_PATH by default), in name order."""
     if not game_list:
         game_list = GAME_PATH.iterdir()
+    game_fns = []
     for game in game_list:
-        try:
-            if game.suffix == '.json':
-                allstats.extend(parse_game_file(game))
+        if game_suffix(game):
+            game_fns.append(game)
+        else:
+            log(1, game, "is not matched")
+    return sorted(game_fns)
+
+
+def game_updates(records):
+    """Game ids of records and the last_update of each."""
+    updates = np.zeros(len(records.games), dtype=np.int64)
+    updates[records.columns['game']] = records.columns['last_update']
+    return records.games.tolist(), updates.tolist()
+
+
+def release_missing(game_fns):
+    """Let go of the games of game files which are gone; returns the game files owning some of them now."""
+    changed = seen.release(game_fn.name for game_fn in game_fns)
+    if changed:
+        log(1, "games of removed game files go back to", ", ".join(sorted(changed)))
+    return [game_fn for game_fn in game_fns if game_fn.name in changed]
+
+
+def drop_games(records, game_fn, game_ids, count=True):
+    """records without the rows of game_ids, counted as skipped unless count is False."""
+    if not game_ids:
+        return records
+    if count:
+        report.skip('duplicate_games', game_fn, len(game_ids))
+    keep = ~np.isin(records.games, game_ids)
+    return records.select(keep[records.columns['game']])
+
+
+def _init_worker(ratings_, thresholds_, debug_, verbosity_, compact_, quantiles_, json_backend, dedup_):
+    global ratings, rating_thresholds, debug, verbosity, compact, quantiles, dedup, _worker
+    ratings = ratings_
+    rating_thresholds = thresholds_
+    debug = debug_
+    verbosity = verbosity_
+    compact = compact_
+    quantiles = quantiles_
+    jsonio.use(json_backend)
+    dedup = dedup_
+    _worker = True
+
+
+def claim_game_file(game_fn, use_cache=True):
+    """Load (or parse and cache) one game file, return its game updates to claim.
+
+    In a worker the RunReport of the file is returned along, for the
+    caller to merge, otherwise None.
+    """
+    global report
+    if _worker:
+        report = RunReport()
+    stats = load_game_file(game_fn, use_cache)
+    if not use_cache:
+        # the statpools are computed from the cache in a second pass
+        save(game_fn, stats)
+    return game_updates(stats), report if _worker else None
+
+
+def parse_game_file_stats(game_fn, game_ids, month_stats, views, use_cache=True, count=True):
+    """Load one game file and return the PlayerPools of views instead of the factions.
+
+    game_ids are duplicates to leave out, month_stats whether the file
+    writes the monthly stats json, count is False when the file was loaded
+    by claim_game_file already. The RunReport is returned along as with
+    claim_game_file.
+    """
+    global report
+    if _worker:
+        report = RunReport()
+    stats = drop_games(load_game_file(game_fn, use_cache, count), game_fn, game_ids)
+    pools = get_player_pools(stats, list(views.values()))
+    # the monthly stats come for free with the 'stats' view, looked up by name
+    # as the key_funcs a worker gets are copies of get_key
+    pool = dict(zip(views, pools)).get('stats')
+    if month_stats:
+        save_month_stats(game_fn, stats, None if pool is None else pool.statpool(stats.ratings))
+    return pools, report if _worker else None
+
+
+def partition_version(game_fn):
+    """What the partitions of a game file depend on: the file, dedup and quantiles.
+
+    Not the ratings: the partitions keep the players, rated as they are merged.
+    """
+    return cache_key(game_fn) + [PARTITION_VERSION, dedup, quantiles]
+
+
+def rated_partition(data):
+    """Statpool of an encoded PlayerPool, with the ratings loaded now."""
+    pool = PlayerPool.decode(data)
+    return pool.statpool(get_ratings(pool.users))
+
+
+def save_index(store):
+    """Save the index of store, after the games seen its partitions left out duplicates by.
+
+    Saved the other way around, a crash in between would leave partitions
+    up to date next to an index of games seen missing their claims.
+    """
+    if seen is not None and seen.changed:
+        seen.save(SEEN_PATH)
+    store.save_index()
+
+
+def update_partitions(store, views, game_list=None, processes=1, use_cache=True):
+    """Bring the partitions of store up to date with the game files.
+
+    views maps the name of every view to its key_func. Only the game
+    files which are new or changed since their partition was computed
+    are aggregated (on a process pool when processes > 1), along with
+    the files which lost games to them as duplicates or got games back
+    from them. The partitions of removed game files are dropped. Returns
+    the game files recomputed.
+    """
+    game_fns = game_files(game_list)
+    names = {game_fn.name for game_fn in game_fns}
+    for name in store.names():
+        if name not in names:
+            log(1, "dropping the partitions of", name)
+            store.remove(name)
+
+    # without the games seen the partitions can not tell which duplicates they left out
+    rebuild = not use_cache or seen is not None and not len(seen)
+    released = release_missing(game_fns) if seen is not None else []
+    stale = [game_fn for game_fn in game_fns
+             if rebuild or game_fn in released or store.version(game_fn.name) != partition_version(game_fn)]
+    if not stale:
+        save_index(store)
+        return stale
+
+    initargs = (ratings, rating_thresholds, debug, verbosity, compact, quantiles, jsonio.backend, dedup)
+    if processes > 1:
+        pool = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=initargs)
+    else:
+        pool = nullcontext()
+    with pool:
+        run = pool.map if processes > 1 else map
+        game_ids = {}
+        if seen is not None:
+            # claim the games of the stale files, then of the files whose games changed owner with them
+            by_name = {game_fn.name: game_fn for game_fn in game_fns}
+            claims = stale
+            while claims:
+                changed = set()
+                claim = partial(claim_game_file, use_cache=use_cache)
+                for game_fn, ((games, last_updates), worker_report) in zip(claims, run(claim, claims)):
+                    if worker_report is not None:
+                        report.merge(worker_report)
+                    changed |= seen.claim(games, last_updates, game_fn.name)
+                    game_ids[game_fn] = games
+                claims = sorted(by_name[name] for name in changed if by_name[name] not in game_ids)
+            stale = sorted(game_ids)
+            game_ids = {game_fn: seen.duplicates(game_fn.name) for game_fn in game_ids}
+            use_cache = True
+
+        # with dedup the claims counted the files already
+        worker = partial(parse_game_file_stats, views=views, use_cache=use_cache, count=seen is None)
+        dup_ids = [game_ids.get(game_fn, ()) for game_fn in stale]
+        # the first game file of a month writes its stats json, not whichever worker gets there first
+        firsts = {}
+        for game_fn in game_fns:
+            firsts.setdefault(month_stats_path(game_fn), game_fn)
+        month_stats = [firsts[month_stats_path(game_fn)] == game_fn for game_fn in stale]
+        for game_fn, (pools, worker_report) in zip(stale, run(worker, stale, dup_ids, month_stats)):
+            if worker_report is not None:
+                report.merge(worker_report)
+            with report.stage('partitions', game_fn):
+                store.save(game_fn.name, dict(zip(views, pools)), partition_version(game_fn))
+    save_index(store)
+    report.count('partitions', len(stale))
+    return stale
+
+
+def moments_only(statpool):
+    """statpool without its quantile digests, which can not be subtracted."""
+    return {key: stats[:len(STATFUNCS)] for key, stats in statpool.items()}
+
+
+def update_rolling(window, game_list=None, use_cache=True):
+    """Statpool of the last window months, period wildcarded, without quantiles.
+
+    The window saved in ROLLING_PATH is slid over the months it has not
+    seen (or whose game file changed): each costs the statpool of that
+    month and subtracting the month leaving the window. With dedup a
+    month leaves out the games other dumps own, as its partition does.
+    """
+    if not game_list:
+        game_list = GAME_PATH.iterdir()
+    game_fns = sorted((game for game in game_list if game_suffix(game)), key=game_name)
+    # a window saved with digests still slides
+    rolling = RollingPool.load(ROLLING_PATH, window, save_stats, lambda fn: moments_only(load_statpool(fn)))
+    for game_fn in game_fns[-window:]:
+        period = game_name(game_fn)
+        version = cache_key(game_fn) + [ratings_version, list(rating_thresholds)]
+        game_ids = seen.duplicates(game_fn.name) if seen is not None else []
+        if game_ids:
+            version.append(hashlib.sha1('\n'.join(game_ids).encode()).hexdigest())
+        if rolling.versions.get(period) == version:
+            continue
+        if period not in rolling.periods and rolling.periods and period < rolling.periods[-1]:
+            continue
+        with report.stage('rolling', game_fn):
+            log(1, "rolling window takes in", period)
+            records = drop_games(load_game_file(game_fn, use_cache, count=False), game_fn, game_ids, count=False)
+            month = roll_pool(moments_only(compute_stats(records, get_key)), get_key.mask('period'))
+            if period in rolling.periods:
+                rolling.replace(period, month, version)
             else:
-                print(game, "is not matched")
-        except KeyboardInterrupt:
-            break
-    return allstats
+                rolling.push(period, month, version)
+    rolling.save(ROLLING_PATH, save_stats)
+    return rolling.pool
 
 
 #####
@@ -390,177 +741,298 @@ def get_rating(player, faction):
         return 0
     if 'score' not in ratings[player]:
         return 0
-    score = ratings[player]['score']
-    if score < 1000:
-        return 1
-    elif score < 1100:
-        return 2
-    elif score < 1250:
-        return 3
-    else:
-        return 4
-
-
-def get_key(faction):
-    # all option at 2016-07-05
-    # option-email-notify:
-    # option-errata-cultist-power:
-    # option-fire-and-ice-factions/ice:
-    # option-fire-and-ice-factions/variable:
-    # option-fire-and-ice-factions/variable_v2:
-    # option-fire-and-ice-factions/variable_v3:
-    # option-fire-and-ice-factions/variable_v4:
-    # option-fire-and-ice-factions/variable_v5:
-    # option-fire-and-ice-factions/volcano:
-    # option-fire-and-ice-final-scoring:
-    # option-loose-adjust-resource:
-    # option-maintain-player-order:
-    # option-mini-expansion-1:
-    # option-shipping-bonus:
-    # option-strict-chaosmagician-sh:
-    # option-strict-darkling-sh:
-    # option-strict-leech:
-    # option-temple-scoring-tile:
-    # option-variable-turn-order:
-
-    # print(faction.score_tiles)
-    key = ''
-    key += str(faction.map_type)  # 0
-    key += '0' if 'errata-cultist-power' not in faction.options else '1'  # 1
-    key += '0' if 'mini-expansion-1' not in faction.options else '1'  # 2
-    key += '0' if 'shipping-bonus' not in faction.options else '1'  # 3
-    key += '0' if 'fire-and-ice-final-scoring' not in faction.options else str(faction.options['fire-and-ice-final-scoring'])  # 4
-    key += '0' if 'fire-and-ice-factions/ice' not in faction.options else '1'  # 5
-    key += '0' if 'fire-and-ice-factions/volcano' not in faction.options else '1'  # 6
-    key += '0' if 'fire-and-ice-factions/variable' not in faction.options else str(faction.options['fire-and-ice-factions/variable'])  # 7
-    key += '0' if 'variable-turn-order' not in faction.options else '1'  # 8
-    key += '0' if 'temple-scoring-tile' not in faction.options else '1'  # 9
-    key += str(faction.score_tiles['1'])  # 10
-    key += str(faction.orders['1'])  # 11
-    key += str(FDICT[faction.name])  # 12
-    key += str(faction.numplayers)  # 13
-    key += str(get_rating(faction.user, faction.name))  # 14
-    key += ''.join(str(i) for i in tuple(faction.builts[:, 1]))  # 15-19
-    key += str(faction.bonus[0])  # 20
-    key += str(faction.leech_pw[1])  # 21
-    # key += str(faction.rank_in_game) #
-    key += faction.period  # 22-24
-    key += ''.join(hex(i + 1)[2] for i in tuple(np.where(faction.favs <= 1)[0]))  # 25-
-    # print(faction.favs)
-    return key
-
-
-def get_key2(faction):
-    # all option at 2016-07-05
-    # option-email-notify:
-    # option-errata-cultist-power:
-    # option-fire-and-ice-factions/ice:
-    # option-fire-and-ice-factions/variable:
-    # option-fire-and-ice-factions/variable_v2:
-    # option-fire-and-ice-factions/variable_v3:
-    # option-fire-and-ice-factions/variable_v4:
-    # option-fire-and-ice-factions/variable_v5:
-    # option-fire-and-ice-factions/volcano:
-    # option-fire-and-ice-final-scoring:
-    # option-loose-adjust-resource:
-    # option-maintain-player-order:
-    # option-mini-expansion-1:
-    # option-shipping-bonus:
-    # option-strict-chaosmagician-sh:
-    # option-strict-darkling-sh:
-    # option-strict-leech:
-    # option-temple-scoring-tile:
-    # option-variable-turn-order:
-
-    # print(faction.score_tiles)
-    key = ''
-    key += str(faction.map_type)  # 0
-    key += '0' if 'errata-cultist-power' not in faction.options else '1'  # 1
-    key += '0' if 'mini-expansion-1' not in faction.options else '1'  # 2
-    key += '0' if 'shipping-bonus' not in faction.options else '1'  # 3
-    key += '0' if 'fire-and-ice-final-scoring' not in faction.options else str(faction.options['fire-and-ice-final-scoring'])  # 4
-    key += '0' if 'fire-and-ice-factions/ice' not in faction.options else '1'  # 5
-    key += '0' if 'fire-and-ice-factions/volcano' not in faction.options else '1'  # 6
-    key += '0' if 'fire-and-ice-factions/variable' not in faction.options else str(faction.options['fire-and-ice-factions/variable'])  # 7
-    key += '0' if 'variable-turn-order' not in faction.options else '1'  # 8
-    key += '0' if 'temple-scoring-tile' not in faction.options else '1'  # 9
-    key += str(faction.score_tiles['1'])  # 10
-    key += str(faction.score_tiles['2'])  # 11
-    key += str(faction.score_tiles['3'])  # 12
-    key += str(faction.score_tiles['4'])  # 13
-    key += str(faction.score_tiles['5'])  # 14
-    key += str(faction.score_tiles['6'])  # 15
-    key += str(faction.orders['1'])  # 16
-    key += str(FDICT[faction.name])  # 17
-    key += str(faction.numplayers)  # 18
-    key += str(get_rating(faction.user, faction.name))  # 19
-    key += ''.join('%d' % faction.all_bons[i] for i in range(1, 11))  # 20-29
-    key += faction.period  # 30-32
-    return key
+    # 1 below the first threshold, one more past every threshold
+    return bisect.bisect_right(rating_thresholds, ratings[player]['score']) + 1
+
+
+def get_ratings(users):
+    """Rating bucket of every user id, looked up once instead of once per key."""
+    return np.array([get_rating(user, None) for user in users.tolist()], dtype=np.int8)
+
+
+# all option at 2016-07-05
+# option-email-notify:
+# option-errata-cultist-power:
+# option-fire-and-ice-factions/ice:
+# option-fire-and-ice-factions/variable:
+# option-fire-and-ice-factions/variable_v2:
+# option-fire-and-ice-factions/variable_v3:
+# option-fire-and-ice-factions/variable_v4:
+# option-fire-and-ice-factions/variable_v5:
+# option-fire-and-ice-factions/volcano:
+# option-fire-and-ice-final-scoring:
+# option-loose-adjust-resource:
+# option-maintain-player-order:
+# option-mini-expansion-1:
+# option-shipping-bonus:
+# option-strict-chaosmagician-sh:
+# option-strict-darkling-sh:
+# option-strict-leech:
+# option-temple-scoring-tile:
+# option-variable-turn-order:
+KEY_OPTIONS = [
+    Digits('errata-cultist-power', 'options', OPTIONS.index('errata-cultist-power'), flag=True),  # 1
+    Digits('mini-expansion-1', 'options', OPTIONS.index('mini-expansion-1'), flag=True),  # 2
+    Digits('shipping-bonus', 'options', OPTIONS.index('shipping-bonus'), flag=True),  # 3
+    Digits('fire-and-ice-final-scoring', 'options', OPTIONS.index('fire-and-ice-final-scoring')),  # 4
+    Digits('fire-and-ice-factions/ice', 'options', OPTIONS.index('fire-and-ice-factions/ice'), flag=True),  # 5
+    Digits('fire-and-ice-factions/volcano', 'options', OPTIONS.index('fire-and-ice-factions/volcano'), flag=True),  # 6
+    Digits('fire-and-ice-factions/variable', 'options', OPTIONS.index('fire-and-ice-factions/variable')),  # 7
+    Digits('variable-turn-order', 'options', OPTIONS.index('variable-turn-order'), flag=True),  # 8
+    Digits('temple-scoring-tile', 'options', OPTIONS.index('temple-scoring-tile'), flag=True),  # 9
+]
+
+get_key = KeySchema('stats', [
+    Code('map', 'map', MAP_CHARS),  # 0
+    *KEY_OPTIONS,  # 1-9
+    Digits('score_tile', 'score_tiles', 0),  # 10
+    Digits('order', 'orders', 1),  # 11
+    Code('faction', 'faction', FACTION_CHARS),  # 12
+    Digits('numplayers', 'numplayers'),  # 13
+    Digits('rating', 'rating'),  # 14
+    Digits('builds', 'builts', (slice(None), 1), count=len(BUILDINGS)),  # 15-19
+    Digits('bonus', 'bonus', 0),  # 20
+    Digits('leech', 'leech_pw', 1),  # 21
+    Code('period', 'period', PERIOD_CHARS),  # 22-24
+    Set('favors', 'favs', '123456789abc', 1),  # 25-, favors taken by round 1
+])
+
+get_key2 = KeySchema('chooser', [
+    Code('map', 'map', MAP_CHARS),  # 0
+    *KEY_OPTIONS,  # 1-9
+    Digits('score_tiles', 'score_tiles', slice(0, 6), count=6),  # 10-15
+    Digits('order', 'orders', 1),  # 16
+    Code('faction', 'faction', FACTION_CHARS),  # 17
+    Digits('numplayers', 'numplayers'),  # 18
+    Digits('rating', 'rating'),  # 19
+    Digits('all_bons', 'all_bons', slice(1, 11), count=10),  # 20-29
+    Code('period', 'period', PERIOD_CHARS),  # 30-32
+])
+
+
+# name of every output view and its key_func, one partition each per game file
+VIEWS = {'stats': get_key, 'chooser': get_key2}
+
+# key positions the shards of every view are split on: map and faction
+SHARD_POSITIONS = {view: (key_func.position('map'), key_func.position('faction')) for view, key_func in VIEWS.items()}
+
+# roll-up masks of get_key, cut after the last position they keep
+ROLLUPS = {
+    # options, scoring, order, faction, player count and rating
+    'setup': get_key.mask()[:get_key.position('builds')],
+    # the above, per period
+    'period': get_key.mask('builds', 'bonus', 'leech')[:get_key.position('favors')],
+    # map, faction and player count
+    'faction': get_key.mask(*(option.name for option in KEY_OPTIONS), 'score_tile', 'order')[:get_key.position('rating')],
+}
+
+
+def valid_records(allstats):
+    """allstats without the factions of games with invalid score tiles."""
+    invalid = allstats.columns['score_tiles'][:, 0] < 0
+    if not invalid.any():
+        return allstats
+    for game in allstats.games[allstats.columns['game'][invalid]]:
+        log(2, "invalid score tiles:", game)
+    report.skip('invalid_score_tiles', n=int(invalid.sum()))
+    return allstats.select(~invalid)
+
+
+def get_statpools(allstats, views):
+    """Statpools of several (statfuncs, key_func) views from one pass over the columns of allstats.
+
+    Every key_func is a KeySchema and every statfunc a Stat, so the keys
+    and values of all factions are computed at once from the columns.
+    Views sharing the same statfuncs list also share their values.
+    """
+    values = {}
+    with report.stage('keys'):
+        allstats = valid_records(allstats)
+        indexes = [key_func.index(allstats) for statfuncs, key_func in views]
+        for statfuncs, key_func in views:
+            if id(statfuncs) not in values:
+                values[id(statfuncs)] = np.stack([statfunc.values(allstats) for statfunc in statfuncs], axis=-1)
+
+    statpools = []
+    with report.stage('aggregate'):
+        for (statfuncs, key_func), (index, group) in zip(views, indexes):
+            value = values[id(statfuncs)]
+            # every group is reduced in one vectorized pass instead of a Welford update per faction
+            moments = group_moments(group, value, len(index))
+            statpool = {key: [Welford.from_moments(*m) for m in stats] for key, stats in zip(index, moments.tolist())}
+            if quantiles:
+                # a digest of every statfunc after the moments
+                for stats, digests in zip(statpool.values(), group_digests(group, value, len(index))):
+                    stats.extend(digests)
+            statpools.append(statpool)
+    return statpools
+
+
+def get_player_pools(allstats, key_funcs):
+    """PlayerPool of STATFUNCS for every KeySchema of key_funcs, the rating left out of their keys."""
+    with report.stage('keys'):
+        allstats = valid_records(allstats)
+        values = np.stack([statfunc.values(allstats) for statfunc in STATFUNCS], axis=-1)
+        splits = [key_func.split(allstats, 'rating') for key_func in key_funcs]
+    with report.stage('aggregate'):
+        return [PlayerPool.build(key_func, allstats, values, quantiles=quantiles, split=split)
+                for key_func, split in zip(key_funcs, splits)]
 
 
 def get_statpool(allstats, statfuncs, key_func=get_key):
-    statpool = {}
-    statbase = [Welford() for x in statfuncs]
-    for faction in allstats:
-        if '1' not in faction.score_tiles:
-            print("invalid score tiles:", faction.game_id)
-            continue
-        key = key_func(faction)
-        stats = statpool.setdefault(key, copy.deepcopy(statbase))
+    return get_statpools(allstats, [(statfuncs, key_func)])[0]
 
-        for i, statfunc in enumerate(statfuncs):
-            stats[i](statfunc(faction))
 
-    return statpool
+STATFUNCS = [
+    Stat('score'),
+    Stat('margin'),
+]
 
 
 def compute_stats(allstats, key_func):
-    return get_statpool(
-        allstats,
-        [
-            lambda fact: float(fact.score),
-            lambda fact: float(fact.margin)
-        ],
-        key_func
-    )
+    return get_statpool(allstats, STATFUNCS, key_func)
+
+
+def compute_all_stats(allstats, key_funcs):
+    """compute_stats for every key_func, in a single walk over allstats."""
+    return get_statpools(allstats, [(STATFUNCS, key_func) for key_func in key_funcs])
 
 
 def save_stats(statpool, filename=None):
-    def jsonify(x):
-        """Handles welford stats"""
-        if x.n == 1:
-            return x.M1
-        else:
-            return x.n, x.M1, x.M2, x.M3, x.M4
+    """Write statpool as json; a Welford with n=1 is its value, others [n, M1, M2, M3, M4].
 
+    A SpillPool is written as its runs are merged, in key order.
+    """
     if filename is None:
         filename = Path('docs/stats.json')
 
-    with open(filename, 'w+') as f:
-        json.dump(statpool, f, default=jsonify, indent=2)
+    with report.stage('save_stats'):
+        if isinstance(statpool, SpillPool):
+            with open(filename, 'wb') as f:
+                keys, size = jsonio.write_statpool(f, statpool.items(), indent=not compact)
+        else:
+            data = jsonio.dumps_statpool(statpool, indent=not compact)
+            with open(filename, 'wb') as f:
+                f.write(data)
+            keys, size = len(statpool), len(data)
+    report.output(filename, keys, size)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of processes parsing game files")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help=f"always parse game files, ignoring {CACHE_PATH.name}/ and {PARTITION_PATH.name}/")
+    parser.add_argument('--shards', action='store_true',
+                        help="also write docs/stats-shards/ and docs/chooser-shards/, binary and split by map and faction")
+    parser.add_argument('--rollup', action='append', choices=sorted(ROLLUPS), default=[],
+                        help="also write docs/stats-ROLLUP.json, merged over the positions the roll-up drops")
+    parser.add_argument('--rolling', type=int, metavar='MONTHS',
+                        help="also write docs/stats-rolling.json over the last MONTHS game files, "
+                             "period wildcarded, without quantiles")
+    parser.add_argument('--range', nargs=2, metavar=('START', 'END'),
+                        help="also write docs/stats-START-END.json over the game files of the months START..END (YYYY-MM)")
+    parser.add_argument('--no-dedup', dest='dedup', action='store_false',
+                        help=f"count a game found in several game files once per file, ignoring {SEEN_PATH.name}")
+    parser.add_argument('--max-memory', type=int, metavar='MB',
+                        help=f"merge the stats json within about MB megabytes, spilling sorted runs to {SPILL_PATH.name}/")
+    parser.add_argument('--quantiles', action='store_true',
+                        help="also keep a quantile digest of score and margin per key (medians, percentiles)")
+    parser.add_argument('--rating-thresholds', metavar='SCORES', default=','.join(map(str, RATING_THRESHOLDS)),
+                        help="scores at which the rating buckets start, comma separated, at most 8 "
+                             "(default: %(default)s); the games are not aggregated again when they change")
+    parser.add_argument('--compact', action='store_true',
+                        help="write the stats json without indentation")
+    parser.add_argument('--json', choices=sorted(jsonio.BACKENDS), default=jsonio.backend,
+                        help="JSON backend (default: %(default)s)")
+    add_verbosity_arguments(parser)
+    parser.add_argument('--force', action='store_true',
+                        help=f"run even when nothing changed since the last run ({uptodate.MANIFEST_PATH.name})")
+    parser.add_argument('--report', type=Path, default=Path('run-report.json'),
+                        help="where to write the JSON run report (timings, counts, skips, key counts, memory)")
+    args = parser.parse_args()
+    try:
+        rating_thresholds = tuple(sorted(float(score) for score in args.rating_thresholds.split(',')))
+    except ValueError:
+        parser.error(f"--rating-thresholds: not a list of scores: {args.rating_thresholds}")
+    if len(rating_thresholds) > 8:
+        parser.error("--rating-thresholds: at most 8 thresholds, the bucket is one key character")
+    if args.max_memory and (args.rollup or args.shards):
+        parser.error("--rollup and --shards need the whole statpool in memory, not --max-memory")
+
     debug = False
+    verbosity = 1 + args.verbose - args.quiet
+    compact = args.compact
+    quantiles = args.quantiles
+    jsonio.use(args.json)
+    dedup = args.dedup
+    seen = SeenGames.load(SEEN_PATH) if dedup else None
 
     try:
-        with open('ratings.json') as f:
-            ratings = json.load(f)['players']
+        with open('ratings.json', 'rb') as f:
+            ratings = jsonio.loads(f.read())['players']
+            st = Path('ratings.json').stat()
+            ratings_version = [st.st_size, st.st_mtime_ns]
     except:
         print("Warning! Download http://terra.snellman.net/data/ratings.json to get player ratings")
         ratings = {}
 
-    allstats = load()
-    if not allstats:
-        if not GAME_PATH.is_dir():
-            print(f"You should download some games (see http://terra.snellman.net/data/events/) to {str(GAME_PATH)}")
-            exit(1)
-        allstats = parse_games()
-        # save(allstats)
+    if not GAME_PATH.is_dir():
+        print(f"You should download some games (see http://terra.snellman.net/data/events/) to {str(GAME_PATH)}")
+        exit(1)
 
-    print("Computing...")
-    save_stats(compute_stats(allstats, get_key), 'docs/stats.json')
+    # only new or changed game files are aggregated, the outputs are merged from their partitions
+    store = PartitionStore(PARTITION_PATH, PlayerPool.encode, rated_partition)
+    recomputed = update_partitions(store, VIEWS, processes=args.jobs, use_cache=args.cache)
+    log(1, len(recomputed), "of", len(store.names()), "partitions recomputed")
 
-    save_stats(compute_stats(allstats, get_key2), 'docs/chooser.json')
-    print("Finished")
+    def spill_pool(name):
+        return SpillPool(args.max_memory << 20, SPILL_PATH / name) if args.max_memory else None
+
+    log(1, "Merging...")
+    with report.stage('merge'):
+        statpools = [store.merge(view, into=spill_pool(view)) for view in VIEWS]
+
+    if seen is not None:
+        log(1, report.skipped['duplicate'] + report.skipped['duplicate_games'], "duplicate games dropped,",
+            len(seen), "games seen")
+
+    save_stats(statpools[0], 'docs/stats.json')
+    with open('docs/layout.json', 'wb') as f:
+        f.write(jsonio.dumps({view: key_func.layout() for view, key_func in VIEWS.items()}, indent=not compact))
+
+    if args.rollup:
+        with report.stage('rollup'):
+            cube = Cube(statpools[0], {name: ROLLUPS[name] for name in args.rollup})
+        for row in cube.report():
+            log(1, "rollup {name} ({mask}): {keys} keys ({ratio:.1%}), built in {build_time:.2f}s, "
+                   "query {query_time:.2e}s vs {base_query_time:.2e}s".format(**row))
+            save_stats(cube.rollups[row['name']].pool, f"docs/stats-{row['name']}.json")
+
+    save_stats(statpools[1], 'docs/chooser.json')
+
+    if args.rolling:
+        save_stats(update_rolling(args.rolling, use_cache=args.cache), 'docs/stats-rolling.json')
+
+    if args.range:
+        start, end = args.range
+        save_stats(store.merge('stats', start, end, spill_pool('range')), f'docs/stats-{start}-{end}.json')
+
+    if args.shards:
+        with report.stage('shards'):
+            save_shards(statpools[0], Path('docs/stats-shards'), SHARD_POSITIONS['stats'])
+            save_shards(statpools[1], Path('docs/chooser-shards'), SHARD_POSITIONS['chooser'])
+    else:
+        # the pages try the shards before the json, so they must not outlive the run which wrote them
+        for path in ('docs/stats-shards', 'docs/chooser-shards'):
+            shutil.rmtree(path, ignore_errors=True)
+    if args.max_memory:
+        report.count('spilled_runs', sum(len(statpool.runs) for statpool in statpools))
+        shutil.rmtree(SPILL_PATH, ignore_errors=True)
+    report.save(args.report)
+    outputs = list(report.outputs) + ['docs/layout.json']
+    if args.shards:
+        outputs += ['docs/stats-shards/index.json', 'docs/chooser-shards/index.json']
+    uptodate.save(inputs, outputs)
+    log(1, "Finished")
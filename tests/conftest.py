@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import sys
+from pathlib import Path
+
+# the modules live at the top of the repository, next to stats.py
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def stats_dir(tmp_path, monkeypatch):
+    """stats.py run in tmp_path: its caches, docs/ and a fresh report there, no ratings."""
+    import stats
+    from report import RunReport
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'docs').mkdir()
+    monkeypatch.setattr(stats, 'CACHE_PATH', tmp_path / 'games.cache')
+    monkeypatch.setattr(stats, 'ROLLING_PATH', tmp_path / 'games.rolling')
+    monkeypatch.setattr(stats, 'SEEN_PATH', tmp_path / 'games.seen.json')
+    monkeypatch.setattr(stats, 'report', RunReport())
+    monkeypatch.setattr(stats, 'verbosity', 0)
+    # set by __main__
+    monkeypatch.setattr(stats, 'ratings', {}, raising=False)
+    monkeypatch.setattr(stats, 'debug', False, raising=False)
+    monkeypatch.setattr(stats, 'seen', None)
+    monkeypatch.setattr(stats, 'dedup', False)
+    return tmp_path
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from io import StringIO
+
+import pytest
+
+from gameio import iter_games
+
+
+def games(text, chunk_size=3):
+    return list(iter_games(StringIO(text), chunk_size))
+
+
+def test_games_across_chunks():
+    assert games('[{"a": [1, 2]} ,\n{"b": "x]"}]', 2) == [{'a': [1, 2]}, {'b': 'x]'}]
+    assert games(' [ ] ') == []
+
+
+def test_number_split_across_chunks():
+    assert games('[12345, 678]') == [12345, 678]
+
+
+@pytest.mark.parametrize('text', ['[{} {}]', '[1 2]', '[1,]', '[,1]', '[1,,2]', '[1', '{}'])
+def test_malformed_arrays(text):
+    with pytest.raises(ValueError):
+        games(text)
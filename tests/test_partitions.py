@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from partitions import PartitionStore
+from rolling import add_pool
+from welford import Welford
+
+MONTHS = ['2017-01.json', '2017-02.json.gz', '2017-03.json']
+
+
+def month_pool(seed):
+    rng = random.Random(seed)
+    keys = [f'a{i:02d}' for i in range(rng.randint(5, 15))]
+    return {key: [Welford([rng.gauss(100, 20) for _ in range(rng.randint(1, 4))]), Welford([rng.gauss(0, 10)])]
+            for key in keys}
+
+
+def assert_same_pool(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        for x, y in zip(a[key], b[key]):
+            assert x.n == y.n
+            for m in ('M1', 'M2', 'M3', 'M4'):
+                assert getattr(x, m) == pytest.approx(getattr(y, m), abs=1e-9)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PartitionStore(tmp_path / 'partitions')
+    for i, name in enumerate(MONTHS):
+        store.save(name, {'stats': month_pool(i), 'other': month_pool(10 + i)}, [name, i])
+    store.save_index()
+    return store
+
+
+def test_index_survives_a_reload(store, tmp_path):
+    store = PartitionStore(tmp_path / 'partitions')
+    assert store.names() == MONTHS
+    assert store.version('2017-02.json.gz') == ['2017-02.json.gz', 1]
+    assert store.version('2017-04.json') is None
+    assert_same_pool(store.load('2017-03.json', 'other'), month_pool(12))
+
+
+def test_merge_a_range_of_months(store):
+    assert store.names('2017-02', '2017-03') == MONTHS[1:]
+    assert_same_pool(store.merge('stats', '2017-02', '2017-03'), add_pool(month_pool(1), month_pool(2)))
+    expected = add_pool(add_pool(month_pool(0), month_pool(1)), month_pool(2))
+    assert_same_pool(store.merge('stats'), expected)
+
+
+def test_remove_drops_the_files(store):
+    store.remove('2017-01.json')
+    assert store.names() == MONTHS[1:]
+    assert not store.filename('2017-01.json', 'stats').exists()
+    assert_same_pool(store.merge('stats', end='2017-02'), month_pool(1))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+import stats
+from bench.generate import GameGenerator
+from players import PlayerPool
+
+
+def assert_same_statpool(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        for x, y in zip(a[key], b[key]):
+            assert x.n == y.n
+            for m in ('M1', 'M2', 'M3', 'M4'):
+                assert getattr(x, m) == pytest.approx(getattr(y, m), rel=1e-9, abs=1e-6)
+
+
+def test_new_thresholds_rebucket_like_a_fresh_aggregation(stats_dir, monkeypatch):
+    game_fn, = GameGenerator(players=100, irregular=0).write(stats_dir / 'games', months=1, games=80)
+    records = stats.load_game_file(game_fn, use_cache=False)
+    rng = random.Random(5)
+    monkeypatch.setattr(stats, 'ratings', {user: {'score': rng.uniform(900, 1400)} for user in records.users.tolist()})
+    pool = PlayerPool.decode(stats.get_player_pools(records, [stats.get_key])[0].encode())
+
+    statpools = []
+    for thresholds in [(1000, 1100, 1250), (950, 1200)]:
+        monkeypatch.setattr(stats, 'rating_thresholds', thresholds)
+        records.ratings = stats.get_ratings(records.users)
+        fresh = stats.compute_stats(stats.valid_records(records), stats.get_key)
+        statpools.append(pool.statpool(stats.get_ratings(pool.users)))
+        assert_same_statpool(statpools[-1], fresh)
+    assert statpools[0].keys() != statpools[1].keys()
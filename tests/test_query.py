@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+import pytest
+
+from query import KeyIndex
+from welford import Welford
+
+KEYS = ['a10b', 'a11b', 'a12bc', 'b10', 'b21a', 'c1']
+
+
+@pytest.fixture
+def statpool():
+    return {key: [Welford([i, i * 2.5 + 1]), Welford([-i])] for i, key in enumerate(KEYS)}
+
+
+@pytest.mark.parametrize('pattern', ['a', 'a1.', 'a1[0-1]b$', '.[12]', '.*a', '.*c$', 'b..', '..', '...$', 'z', '^b'])
+def test_match_like_a_regex(statpool, pattern):
+    index = KeyIndex(statpool)
+    regex = re.compile('^' + pattern.lstrip('^'))
+    assert [KEYS[i] for i in index.match(pattern)] == [key for key in KEYS if regex.match(key)]
+
+
+def test_query_merges_the_matching_keys(statpool):
+    index = KeyIndex(statpool)
+    score, margin = index.query('a1.')
+    expected = statpool['a10b'][0] + statpool['a11b'][0] + statpool['a12bc'][0]
+    assert score.n == expected.n == 6
+    for a, b in zip((score.M1, score.M2, score.M3, score.M4), (expected.M1, expected.M2, expected.M3, expected.M4)):
+        assert a == pytest.approx(b)
+    assert margin.mean == pytest.approx(-1)
+    assert index.query('z') is None
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import stats
+from bench.generate import GameGenerator
+
+
+def test_window_slides_with_quantiles(stats_dir, monkeypatch, tmp_path_factory):
+    monkeypatch.setattr(stats, 'quantiles', True)
+    game_fns = GameGenerator(players=200, irregular=0).write(stats_dir / 'games', months=3, games=40)
+    stats.update_rolling(2, game_fns[:2])
+    slid = stats.update_rolling(2, game_fns)
+
+    monkeypatch.setattr(stats, 'ROLLING_PATH', tmp_path_factory.mktemp('fresh') / 'games.rolling')
+    fresh = stats.update_rolling(2, game_fns)
+    assert slid.keys() == fresh.keys()
+    for key, welfords in fresh.items():
+        assert len(slid[key]) == len(welfords) == len(stats.STATFUNCS)
+        for a, b in zip(slid[key], welfords):
+            assert a.n == b.n
+            assert a.M1 == pytest.approx(b.M1)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import stats
+
+
+def kept(mask):
+    """Dimensions of get_key the roll-up mask keeps whole."""
+    names = []
+    for dimension in stats.get_key.dimensions:
+        start = stats.get_key.position(dimension.name)
+        part = mask[start:start + (dimension.width or len(dimension.chars))]
+        if part and set(part) == {'1'}:
+            names.append(dimension.name)
+    return names
+
+
+def test_rollups_keep_their_dimensions():
+    setup = ['map', *(option.name for option in stats.KEY_OPTIONS), 'score_tile', 'order', 'faction', 'numplayers', 'rating']
+    assert kept(stats.ROLLUPS['setup']) == setup
+    assert kept(stats.ROLLUPS['period']) == setup + ['period']
+    assert kept(stats.ROLLUPS['faction']) == ['map', 'faction', 'numplayers']
+    for mask in stats.ROLLUPS.values():
+        assert mask.endswith('1')
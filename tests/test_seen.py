@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import stats
+from bench.generate import GameGenerator
+from partitions import PartitionStore
+from players import PlayerPool
+from seen import SeenGames
+
+
+def test_latest_update_owns_then_first_name():
+    seen = SeenGames()
+    assert seen.claim(['g1', 'g2'], [5, 5], 'b') == set()
+    assert seen.claim(['g1', 'g2'], [6, 5], 'a') == {'b'}
+    assert seen.owner('g1') == 'a'
+    assert seen.owner('g2') == 'a'
+    assert seen.duplicates('b') == ['g1', 'g2']
+    assert seen.duplicates('a') == []
+
+
+def test_claim_replaces_the_games_of_a_dump():
+    seen = SeenGames()
+    seen.claim(['g1', 'g2'], [1, 1], 'a')
+    seen.claim(['g2', 'g3'], [1, 1], 'b')
+    assert seen.duplicates('b') == ['g2']
+    # a is downloaded again without g2, which goes back to b
+    assert seen.claim(['g1'], [1], 'a') == {'b'}
+    assert seen.owner('g2') == 'b'
+    assert seen.duplicates('b') == []
+    assert seen.claim(['g1'], [1], 'a') == set()
+
+
+def test_release_and_reload(tmp_path):
+    seen = SeenGames()
+    seen.claim(['g1'], [1], 'a')
+    seen.claim(['g1', 'g2'], [1, 1], 'b')
+    seen.save(tmp_path / 'seen.json')
+    seen = SeenGames.load(tmp_path / 'seen.json')
+    assert seen.duplicates('b') == ['g1']
+    assert seen.release(['b']) == {'b'}
+    assert seen.duplicates('b') == []
+    assert len(seen) == 2
+
+
+def samples(stats_dir, game_fns):
+    """Samples in the stats statpool of an update_partitions run over game_fns in stats_dir."""
+    store = PartitionStore(stats_dir / 'partitions', PlayerPool.encode, stats.rated_partition)
+    stats.update_partitions(store, stats.VIEWS, game_fns)
+    return sum(s[0].n for s in store.merge('stats').values())
+
+
+def test_redownload_gives_games_back(stats_dir, monkeypatch, tmp_path_factory):
+    monkeypatch.setattr(stats, 'seen', SeenGames())
+    monkeypatch.setattr(stats, 'dedup', True)
+    games = stats_dir / 'games'
+    jan, feb = GameGenerator(players=200, irregular=0).write(games, months=2, games=60)
+    january = json.loads(jan.read_text())
+    # february also holds 20 games of january, counted once
+    feb.write_text(json.dumps(json.loads(feb.read_text()) + january[:20]))
+    before = samples(stats_dir, [jan, feb])
+    # saved along with the partitions
+    assert SeenGames.load(stats.SEEN_PATH).duplicates(feb.name) == sorted(game['game'] for game in january[:20])
+
+    # january is downloaded again without them: they are february's now
+    jan.write_text(json.dumps(january[20:]))
+    incremental = samples(stats_dir, [jan, feb])
+    assert incremental == before
+
+    fresh_dir = tmp_path_factory.mktemp('fresh')
+    monkeypatch.chdir(fresh_dir)
+    (fresh_dir / 'docs').mkdir()
+    monkeypatch.setattr(stats, 'CACHE_PATH', fresh_dir / 'games.cache')
+    monkeypatch.setattr(stats, 'SEEN_PATH', fresh_dir / 'games.seen.json')
+    monkeypatch.setattr(stats, 'seen', SeenGames())
+    assert samples(fresh_dir, [jan, feb]) == incremental
+
+
+def test_rolling_counts_duplicates_once(stats_dir, monkeypatch):
+    monkeypatch.setattr(stats, 'seen', SeenGames())
+    monkeypatch.setattr(stats, 'dedup', True)
+    jan, feb = GameGenerator(players=200, irregular=0).write(stats_dir / 'games', months=2, games=60)
+    feb.write_text(json.dumps(json.loads(feb.read_text()) + json.loads(jan.read_text())[:20]))
+    partitioned = samples(stats_dir, [jan, feb])
+    rolling = stats.update_rolling(2, [jan, feb])
+    assert sum(s[0].n for s in rolling.values()) == partitioned
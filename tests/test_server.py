@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from query import KeyIndex
+from rollup import Cube
+from server import QueryService
+from welford import Welford
+
+KEYS = ['a10b', 'a11b', 'a12c', 'b10b', 'b21c']
+
+
+@pytest.fixture
+def statpool():
+    return {key: [Welford([i, i * 3 + 1.]), Welford([-i])] for i, key in enumerate(KEYS)}
+
+
+def test_query_answers_like_the_merged_welfords(statpool):
+    service = QueryService(KeyIndex(statpool))
+    status, body = service.handle('GET', '/query?pattern=a1.b&pattern=z')
+    assert status == 200
+    merged = statpool['a10b'][0] + statpool['a11b'][0]
+    assert body['a1.b']['score'] == {'n': merged.n, 'mean': pytest.approx(merged.mean), 'std': pytest.approx(merged.std)}
+    assert body['a1.b']['margin']['mean'] == pytest.approx(-0.5)
+    assert body['z'] is None
+
+
+def test_rollups_answer_the_same(statpool):
+    plain = QueryService(KeyIndex(statpool))
+    rolled = QueryService(Cube(statpool, {'map': '1', 'prefix': '11.'}))
+    for pattern in ['a', 'a.', 'b..', 'a1.b', '.1.c', '..']:
+        assert rolled.handle('GET', '/query?pattern=' + pattern) == plain.handle('GET', '/query?pattern=' + pattern)
+
+
+def test_results_are_cached(statpool):
+    service = QueryService(KeyIndex(statpool), cache_size=8)
+    for _ in range(3):
+        service.handle('GET', '/query?pattern=b')
+    status, info = service.handle('GET', '/stats')
+    assert status == 200
+    assert (info['hits'], info['misses'], info['maxsize']) == (2, 1, 8)
+
+
+@pytest.mark.parametrize('method, target, status', [
+    ('POST', '/query?pattern=a', 405),
+    ('GET', '/query', 400),
+    ('GET', '/nowhere', 404),
+])
+def test_bad_requests(statpool, method, target, status):
+    assert QueryService(KeyIndex(statpool)).handle(method, target)[0] == status
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+
+import pytest
+
+from digest import Digest
+from shards import decode_shard, encode_shard, load_shards, save_shards
+from welford import Welford
+
+
+def statpool(digests=False):
+    rng = random.Random(2)
+    pool = {}
+    for map_type in 'ab':
+        for faction in 'cdef':
+            for i in range(rng.randint(1, 6)):
+                values = [rng.gauss(120, 25) for _ in range(rng.randint(1, 9))]
+                stats = [Welford(values), Welford([v - 120 for v in values])]
+                if digests:
+                    stats += [Digest(values), Digest([v - 120 for v in values])]
+                pool[f'{map_type}{i}{faction}{i % 3}'] = stats
+    return pool
+
+
+def assert_same_statpool(a, b):
+    assert list(a) == list(b)
+    for key in a:
+        assert len(a[key]) == len(b[key])
+        for x, y in zip(a[key], b[key]):
+            if isinstance(x, Welford):
+                assert (x.n, x.M1, x.M2, x.M3, x.M4) == (y.n, y.M1, y.M2, y.M3, y.M4)
+            else:
+                assert (x.means, x.weights) == (y.means, y.weights)
+
+
+@pytest.mark.parametrize('digests', [False, True])
+def test_shard_round_trip(digests):
+    pool = statpool(digests)
+    assert_same_statpool(decode_shard(encode_shard(pool)), pool)
+
+
+@pytest.mark.parametrize('digests', [False, True])
+def test_saved_shards_load_back(tmp_path, digests):
+    pool = statpool(digests)
+    save_shards(pool, tmp_path / 'shards', (0, 2))
+    with open(tmp_path / 'shards' / 'index.json') as f:
+        index = json.load(f)
+    assert index['positions'] == [0, 2]
+    assert sorted(index['shards']) == [m + f for m in 'ab' for f in 'cdef']
+    assert sum(shard['keys'] for shard in index['shards'].values()) == len(pool)
+
+    loaded = load_shards(tmp_path / 'shards')
+    assert_same_statpool({key: loaded[key] for key in pool}, pool)
+    assert set(load_shards(tmp_path / 'shards', ['ad'])) == {key for key in pool if key[0] + key[2] == 'ad'}
+
+
+def test_empty_shard():
+    assert decode_shard(encode_shard({})) == {}
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from digest import Digest
+from rolling import add_pool
+from spill import KEY_BYTES, SpillPool
+from welford import Welford
+
+
+def partials(digests=False, count=6):
+    rng = random.Random(1)
+    for _ in range(count):
+        statpool = {}
+        for key in rng.sample([f'k{i:03d}' for i in range(40)], 12):
+            values = [rng.gauss(100, 20) for _ in range(rng.randint(1, 3))]
+            statpool[key] = [Welford(values), Welford([v - 100 for v in values])]
+            if digests:
+                statpool[key] += [Digest(values), Digest([v - 100 for v in values])]
+        yield statpool
+
+
+@pytest.mark.parametrize('digests', [False, True])
+def test_spilled_merge_matches_in_memory(tmp_path, digests):
+    pool = SpillPool(5 * KEY_BYTES, tmp_path / 'spill')
+    expected = {}
+    for statpool in partials(digests):
+        pool.add(statpool)
+        add_pool(expected, {key: list(stats) for key, stats in statpool.items()})
+    assert len(pool.runs) > 1
+
+    items = list(pool.items())
+    assert [key for key, _ in items] == sorted(expected)
+    for key, stats in items:
+        assert len(stats) == len(expected[key])
+        for a, b in zip(stats[:2], expected[key]):
+            assert a.n == b.n
+            assert a.M1 == pytest.approx(b.M1)
+            assert a.M2 == pytest.approx(b.M2)
+        for a, b in zip(stats[2:], expected[key][2:]):
+            assert a.n == b.n
+            assert a.median == pytest.approx(b.median)
+
+    pool.clear()
+    assert not (tmp_path / 'spill').exists()
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from welford import Welford
+
+
+def moments(w):
+    return w.n, w.M1, w.M2, w.M3, w.M4
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_subtracting_undoes_adding(seed):
+    rng = random.Random(seed)
+    a = Welford([rng.expovariate(0.05) for _ in range(rng.randint(2, 50))])
+    b = Welford([rng.gauss(80, 40) for _ in range(rng.randint(1, 50))])
+    assert moments((a + b) - b) == pytest.approx(moments(a), rel=1e-7, abs=1e-6)
+
+
+def test_subtracting_matches_the_remaining_sample():
+    values = [3., 7., 1., 12., 5., 8., 2.]
+    remaining = Welford(values[:4]) + Welford(values[4:]) - Welford(values[4:])
+    assert moments(remaining) == pytest.approx(moments(Welford(values[:4])))
+    assert remaining.kurtosis == pytest.approx(Welford(values[:4]).kurtosis)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Fingerprints of what a stats run depends on, to skip runs with nothing to do
+
+A run records in games.manifest.json the fingerprint of its inputs (the
+game files, ratings.json, the sources declaring BLACKLIST, MAPDICT,
+FDICT and the key schemas, and its command line) and of the outputs it
+wrote. The next run with the same fingerprint and untouched outputs has
+nothing to do, which is known from a few stat() calls, before NumPy is
+even imported. Only the standard library is used here for that reason.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+from gameio import game_suffix
+
+PACKAGE_DIR = Path(__file__).parent
+GAME_PATH = PACKAGE_DIR / 'games'
+MANIFEST_PATH = PACKAGE_DIR / 'games.manifest.json'
+
+# options which always do the work
+FORCE_OPTIONS = ('--force', '--no-cache', '-h', '--help')
+
+
+def file_key(path):
+    """Size and mtime of path, None if it does not exist."""
+    try:
+        st = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def sources_key():
+    """Hash of the sources of the package, where the tables and key layouts are declared."""
+    h = hashlib.sha1()
+    for source in sorted(PACKAGE_DIR.glob('*.py')):
+        h.update(source.name.encode())
+        h.update(source.read_bytes())
+    return h.hexdigest()
+
+
+def fingerprint(argv):
+    """Fingerprint of the inputs of a run with the command line argv."""
+    games = None
+    if GAME_PATH.is_dir():
+        games = {game.name: file_key(game) for game in sorted(GAME_PATH.iterdir()) if game_suffix(game)}
+    return {
+        'argv': list(argv),
+        'games': games,
+        'ratings': file_key('ratings.json'),
+        'sources': sources_key(),
+    }
+
+
+def load():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_current(inputs):
+    """Whether the last run had the same inputs and its outputs are untouched since."""
+    if any(option in inputs['argv'] for option in FORCE_OPTIONS):
+        return False
+    manifest = load()
+    if manifest is None or manifest['inputs'] != inputs:
+        return False
+    return all(file_key(output) == key for output, key in manifest['outputs'].items())
+
+
+def save(inputs, outputs):
+    """Record the inputs of a finished run and the outputs it wrote."""
+    with open(MANIFEST_PATH, 'w+') as f:
+        json.dump({'inputs': inputs, 'outputs': {str(output): file_key(output) for output in outputs}}, f, indent=2)
@@ -2,6 +2,8 @@
 
 import math
 
+import numpy as np
+
 
 class Welford(object):
     """Implements Welford's algorithm for computing a running mean
@@ -41,6 +43,16 @@ class Welford(object):
 
         self.__call__(lst)
 
+    @classmethod
+    def from_moments(cls, n, M1, M2, M3, M4):
+        new = cls()
+        new.n = int(n)
+        new.M1 = M1
+        new.M2 = M2
+        new.M3 = M3
+        new.M4 = M4
+        return new
+
     def update(self, x):
         if x is None:
             return
@@ -52,7 +64,7 @@ class Welford(object):
         delta_n2 = delta_n * delta_n
         term1 = delta * delta_n * n1
         self.M1 += delta_n
-        self.M4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6 * delta_n2 * self.M2
+        self.M4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6 * delta_n2 * self.M2 - 4 * delta_n * self.M3
         self.M3 += term1 * delta_n * (n - 2) - 3 * delta_n * self.M2
         self.M2 += term1
 
@@ -84,6 +96,32 @@ class Welford(object):
 
         return new
 
+    def __sub__(c, b):
+        """Inverse of __add__: the Welford a such that a + b == c
+
+        b has to be part of what c was merged from.
+        """
+        new = Welford()
+        new.n = c.n - b.n
+        if new.n <= 0:
+            return new
+        a = new
+        a.M1 = (c.n * c.M1 - b.n * b.M1) / a.n
+        if a.n == 1:
+            # a single sample has no spread, whatever rounding says
+            return a
+        delta = b.M1 - a.M1
+        delta2 = delta * delta
+        delta3 = delta2 * delta
+        delta4 = delta2 * delta2
+
+        a.M2 = max(0.0, c.M2 - b.M2 - delta2 * a.n * b.n / c.n)
+        a.M3 = c.M3 - b.M3 - delta3 * a.n * b.n * (a.n - b.n) / (c.n * c.n) - \
+               3.0 * delta * (a.n * b.M2 - b.n * a.M2) / c.n
+        a.M4 = c.M4 - b.M4 - delta4 * a.n * b.n * (a.n * a.n - a.n * b.n + b.n * b.n) / (c.n * c.n * c.n) - \
+               6.0 * delta2 * (a.n * a.n * b.M2 + b.n * b.n * a.M2) / (c.n * c.n) - 4.0 * delta * (a.n * b.M3 - b.n * a.M3) / c.n
+        return a
+
     @property
     def mean(self):
         return self.M1
@@ -112,3 +150,96 @@ class Welford(object):
 
     def __repr__(self):
         return '{} +- {}'.format(self.mean, self.std)
+
+
+def group_moments(groups, values, ngroups=None):
+    """Computes n, M1, M2, M3, M4 of many groups at once
+
+    groups  - group index (0 <= g < ngroups) of each sample
+    values  - samples (x stats) array, every stat is aggregated separately
+
+    Returns an ngroups x stats x 5 array. The central moments are summed
+    in a second pass around each group mean instead of being updated one
+    sample at a time, so the result equals a Welford fed group by group.
+
+        >>> group_moments([0, 1, 0], [[1.], [5.], [3.]])[:, 0]
+        array([[2., 2., 2., 0., 2.],
+               [1., 5., 0., 0., 0.]])
+    """
+    groups = np.asarray(groups, dtype=np.intp)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    if ngroups is None:
+        ngroups = groups.max() + 1 if len(groups) else 0
+
+    n = np.bincount(groups, minlength=ngroups).astype(float)
+    result = np.zeros((ngroups, values.shape[1], 5))
+    result[..., 0] = n[:, None]
+    for i, x in enumerate(values.T):
+        mean = np.divide(np.bincount(groups, x, ngroups), n, out=np.zeros(ngroups), where=n > 0)
+        delta = x - mean[groups]
+        delta2 = delta * delta
+        result[:, i, 1] = mean
+        result[:, i, 2] = np.bincount(groups, delta2, ngroups)
+        result[:, i, 3] = np.bincount(groups, delta2 * delta, ngroups)
+        result[:, i, 4] = np.bincount(groups, delta2 * delta2, ngroups)
+    return result
+
+
+def merge_moments(moments, axis=0):
+    """Merges n, M1, M2, M3, M4 rows along axis, as Welford.__add__ would
+
+    All rows are combined at once around the merged mean, so merging
+    thousands of Welfords is a handful of array reductions.
+
+        >>> merge_moments(group_moments([0, 1, 0], [1., 5., 3.]))
+        array([[ 3.,  3.,  8.,  0., 32.]])
+    """
+    moments = np.asarray(moments, dtype=float)
+    n = moments[..., 0].sum(axis=axis)
+    nx = np.moveaxis(moments, axis, 0)
+    mean = np.divide((nx[..., 0] * nx[..., 1]).sum(axis=0), n, out=np.zeros(np.shape(n)), where=n > 0)
+    delta = nx[..., 1] - mean
+    delta2 = delta * delta
+    counts, M2, M3 = nx[..., 0], nx[..., 2], nx[..., 3]
+
+    result = np.empty(np.shape(n) + (5,))
+    result[..., 0] = n
+    result[..., 1] = mean
+    result[..., 2] = (M2 + counts * delta2).sum(axis=0)
+    result[..., 3] = (M3 + 3 * delta * M2 + counts * delta2 * delta).sum(axis=0)
+    result[..., 4] = (nx[..., 4] + 4 * delta * M3 + 6 * delta2 * M2 + counts * delta2 * delta2).sum(axis=0)
+    return result
+
+
+def merge_group_moments(groups, moments, ngroups=None):
+    """Merges the n, M1, M2, M3, M4 rows of each group, as Welford.__add__ would
+
+    groups  - group index (0 <= g < ngroups) of each row
+    moments - rows x stats x 5 array, as group_moments returns
+
+    Returns an ngroups x stats x 5 array, like group_moments does for
+    samples instead of partial moments.
+
+        >>> merge_group_moments([0, 0], group_moments([0, 1, 0], [1., 5., 3.]))[:, 0]
+        array([[ 3.,  3.,  8.,  0., 32.]])
+    """
+    groups = np.asarray(groups, dtype=np.intp)
+    moments = np.asarray(moments, dtype=float)
+    if ngroups is None:
+        ngroups = groups.max() + 1 if len(groups) else 0
+
+    result = np.zeros((ngroups, moments.shape[1], 5))
+    for i in range(moments.shape[1]):
+        counts, M1, M2, M3, M4 = moments[:, i].T
+        n = np.bincount(groups, counts, ngroups)
+        mean = np.divide(np.bincount(groups, counts * M1, ngroups), n, out=np.zeros(ngroups), where=n > 0)
+        delta = M1 - mean[groups]
+        delta2 = delta * delta
+        result[:, i, 0] = n
+        result[:, i, 1] = mean
+        result[:, i, 2] = np.bincount(groups, M2 + counts * delta2, ngroups)
+        result[:, i, 3] = np.bincount(groups, M3 + 3 * delta * M2 + counts * delta2 * delta, ngroups)
+        result[:, i, 4] = np.bincount(groups, M4 + 4 * delta * M3 + 6 * delta2 * M2 + counts * delta2 * delta2, ngroups)
+    return result